@@ -1,3 +1,11 @@
-from .graph import agent_app
-
 __all__ = ["agent_app"]
+
+
+def __getattr__(name):
+    # graph는 모델/RAG를 로드하므로, state/menu만 필요한 스크립트와 테스트를 위해
+    # agent_app에 처음 접근할 때 import 합니다.
+    if name == "agent_app":
+        from .graph import agent_app
+
+        return agent_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,4 +1,5 @@
 import json
+import os
 
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, StateGraph
@@ -14,9 +15,9 @@ from app.agent.handlers import (
     handle_remove,
     handle_store_info,
 )
-from app.agent.router import classify_intent
-from app.agent.state import AgentState, Intent
-from app.agent.utils import PROMPTS
+from app.agent.router import CART_INTENTS, classify_and_extract, classify_intent
+from app.agent.state import AgentState, Intent, message_content
+from app.agent.utils import PROMPTS, compile_template, fill_template
 from app.engine import engine
 from app.rag import rag_engine
 
@@ -32,31 +33,39 @@ INTENT_MAP = {
     Intent.REMOVE.value: handle_remove,
 }
 
+# FUSED_ROUTER=true: 의도 분류 + 카트 추출을 한 번의 생성으로 처리
+USE_FUSED_ROUTER = os.getenv("FUSED_ROUTER", "false").lower() == "true"
+
 workflow = StateGraph(AgentState)
 
 # 1. Router 등록
-workflow.add_node("classify", classify_intent)
+workflow.add_node(
+    "classify", classify_and_extract if USE_FUSED_ROUTER else classify_intent
+)
 workflow.set_entry_point("classify")
 
 
 def extract_cart_update(state: AgentState):
     messages = state["messages"]
-    query = messages[-1]["content"]
+    query = message_content(messages[-1])
 
     prev_ai_msg = ""
     if len(messages) >= 2:
-        prev_ai_msg = messages[-2]["content"]
+        prev_ai_msg = message_content(messages[-2])
 
     search_query = f"{prev_ai_msg} {query}" if prev_ai_msg else query
-    docs = rag_engine.search(search_query, filter={"type": "menu"}, k=10)
+    docs = rag_engine.search(
+        search_query, filter={"type": "menu"}, k=10, name_match_k=4
+    )
     menu_context = "\n".join(docs)
 
-    prompt_template = PROMPTS["extraction"]["task"]
-    extraction_prompt = prompt_template.format(
-        menu_context=menu_context, prev_ai_msg=prev_ai_msg, user_query=query
+    segments = compile_template(PROMPTS["extraction"]["task"])
+    parts = fill_template(
+        segments, menu_context=menu_context, prev_ai_msg=prev_ai_msg, user_query=query
     )
+    prompt_tokens = engine.encode_prompt_parts(parts)
 
-    response = engine.generate_text(extraction_prompt, max_tokens=100, temperature=0.0)
+    response = engine.generate_text(prompt_tokens, max_tokens=100, temperature=0.0)
 
     try:
         start = response.find("[")
@@ -83,7 +92,10 @@ for key, func in INTENT_MAP.items():
 # 3. 라우팅 로직
 def route_logic(state: AgentState):
     intent = state["current_intent"]
-    if intent in [Intent.ORDER.value, Intent.REMOVE.value]:
+    if intent in CART_INTENTS:
+        # Fused 라우터는 이미 카트를 추출했으므로 바로 주문 응답으로 이동
+        if USE_FUSED_ROUTER:
+            return f"{Intent.ORDER.value}_handler"
         return "extract_cart"
 
     return (
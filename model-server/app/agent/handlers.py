@@ -1,20 +1,30 @@
-from app.agent.state import AgentState
-from app.agent.utils import PERSONAS, PROMPTS, build_prompt
+from app.agent.state import AgentState, cart_items, message_content
+from app.agent.utils import PERSONAS, PROMPTS, build_prompt_parts, render_prompt
 from app.rag import rag_engine
 
 
 def handle_order(state: AgentState):
-    query = state["messages"][-1]["content"]
-    docs = rag_engine.search(query, filter={"type": "menu"}, k=10)
+    messages = state["messages"]
+    query = message_content(messages[-1])
+    # "네, 그걸로 할게요" 같은 수락 턴은 직전 AI 메시지에 메뉴 이름이 있으므로 함께 검색
+    prev_ai_msg = message_content(messages[-2]) if len(messages) >= 2 else ""
+    search_query = f"{prev_ai_msg} {query}" if prev_ai_msg else query
+    docs = rag_engine.search(
+        search_query, filter={"type": "menu"}, k=10, name_match_k=3
+    )
 
     task = PROMPTS["order"]["task"]
-    prompt = build_prompt("rosy", task, "\n".join(docs), query)
+    parts = build_prompt_parts("rosy", task, "\n".join(docs), query)
 
-    return {"final_response": prompt, "temperature": 0.1}
+    return {
+        "final_response": render_prompt(parts),
+        "prompt_parts": parts,
+        "temperature": 0.1,
+    }
 
 
 def handle_history(state: AgentState):
-    cart = state.get("cart", [])
+    cart = cart_items(state.get("cart"))
     p = PERSONAS["rosy"]
     prefix = p["prefix"]
 
@@ -22,6 +32,7 @@ def handle_history(state: AgentState):
         return {
             "final_response": f"{prefix}You haven't ordered anything yet! Feel free to ask about our menu!",
             "temperature": 0.0,
+            "static_response": True,
         }
 
     receipt_lines = []
@@ -40,25 +51,40 @@ def handle_history(state: AgentState):
 Total: ${total_price:.2f}
 Is this correct?"""
 
-    return {"final_response": final_response, "temperature": 0.0}
+    # 영수증은 카트로부터 결정적으로 생성되므로 LLM을 거치지 않고 그대로 전송
+    return {
+        "final_response": final_response,
+        "temperature": 0.0,
+        "static_response": True,
+    }
 
 
 def handle_greeting(state: AgentState):
-    user_msg = state["messages"][-1]["content"]
+    user_msg = message_content(state["messages"][-1])
     if user_msg == "___INIT_GREETING___":
-        user_msg = "Hello! I just walked in."
+        # 입장 인사는 항상 같은 내용이므로 미리 준비된 문장을 바로 전송
+        prefix = PERSONAS["rosy"]["prefix"]
+        return {
+            "final_response": (
+                f"{prefix}Welcome to Gemma Burger! How can I help you today?"
+            ),
+            "temperature": 0.0,
+            "static_response": True,
+        }
 
+    parts = build_prompt_parts("rosy", "Greet warmly. No info.", "", user_msg)
     return {
-        "final_response": build_prompt("rosy", "Greet warmly. No info.", "", user_msg),
+        "final_response": render_prompt(parts),
+        "prompt_parts": parts,
         "temperature": 0.7,
     }
 
 
 # ... (handle_complaint, handle_menu_qa, handle_store_info 도 유사하게 작성)
-# 공간상 생략했지만, 기존 로직에서 build_prompt와 PROMPTS[...]만 교체하면 됩니다.
+# 공간상 생략했지만, 기존 로직에서 build_prompt_parts와 PROMPTS[...]만 교체하면 됩니다.
 # 나머지 함수들도 위 패턴대로 작성해 주세요.
 def handle_complaint(state: AgentState):
-    query = state["messages"][-1]["content"]
+    query = message_content(state["messages"][-1])
     print("🚨 [Agent] Complaint detected! Switching to Manager Gordon.")
 
     history = state["messages"]
@@ -67,61 +93,77 @@ def handle_complaint(state: AgentState):
         task = "Listen to the customer's complaint and ask clarifying questions (e.g., dine-in/take-out, specific item) before offering any solutions."
         context = "Initial inquiry - focus on listening."
     else:
-        docs = rag_engine.search(query, filter={"type": "info"}, k=5)
+        docs = rag_engine.search(query, filter={"type": "info"}, k=5, name_match_k=3)
         context = "\n".join(docs)
         task = PROMPTS["complaint"]["task"]
 
-    prompt = build_prompt("gordon", task, context, query)
-    return {"final_response": prompt, "temperature": 0.2}
+    parts = build_prompt_parts("gordon", task, context, query)
+    return {
+        "final_response": render_prompt(parts),
+        "prompt_parts": parts,
+        "temperature": 0.2,
+    }
 
 
 def handle_menu_qa(state):
     """메뉴 질문/추천 -> Rosy (메뉴판 검색)"""
-    query = state["messages"][-1]["content"]
+    query = message_content(state["messages"][-1])
 
     docs = rag_engine.search(query, filter={"type": "menu"}, k=10)
     context = "\n".join(docs)
 
     task = PROMPTS["menu_qa"]["task"]
 
-    prompt = build_prompt("rosy", task, context, query)
+    parts = build_prompt_parts("rosy", task, context, query)
 
-    return {"final_response": prompt, "temperature": 0.2}
+    return {
+        "final_response": render_prompt(parts),
+        "prompt_parts": parts,
+        "temperature": 0.2,
+    }
 
 
 def handle_store_info(state):
     """매장 시설 질문 -> Rosy (매장 정보 검색)"""
-    query = state["messages"][-1]["content"]
+    query = message_content(state["messages"][-1])
 
-    docs = rag_engine.search(query, filter={"type": "info"}, k=5)
+    docs = rag_engine.search(query, filter={"type": "info"}, k=5, name_match_k=3)
     context = "\n".join(docs)
 
     task = PROMPTS["store_info"]["task"]
 
-    prompt = build_prompt("rosy", task, context, query)
+    parts = build_prompt_parts("rosy", task, context, query)
 
     # 정보 전달은 정확해야 하므로 온도를 낮춤
-    return {"final_response": prompt, "temperature": 0.2}
+    return {
+        "final_response": render_prompt(parts),
+        "prompt_parts": parts,
+        "temperature": 0.2,
+    }
 
 
 def handle_cancel(state: AgentState):
-    query = state["messages"][-1]["content"]
-    task = PROMPTS["cancel"]["task"]
-    prompt = build_prompt("rosy", task, "", query)
+    prefix = PERSONAS["rosy"]["prefix"]
 
+    # 취소 확인 문구는 고정이므로 LLM 호출 없이 바로 전송
     return {
         "cart": [{"command": "RESET"}],
-        "final_response": prompt,
+        "final_response": (
+            f"{prefix}Your order has been canceled and your cart is now empty. "
+            "Would you like to start a new order?"
+        ),
         "temperature": 0.0,
+        "static_response": True,
     }
 
 
 def handle_remove(state: AgentState):
-    query = state["messages"][-1]["content"]
+    query = message_content(state["messages"][-1])
     task = PROMPTS["remove"]["task"]
-    prompt = build_prompt("rosy", task, "", query)
+    parts = build_prompt_parts("rosy", task, "", query)
 
     return {
-        "final_response": prompt,
+        "final_response": render_prompt(parts),
+        "prompt_parts": parts,
         "temperature": 0.0,
     }
@@ -0,0 +1,91 @@
+import json
+import re
+from dataclasses import dataclass
+from difflib import get_close_matches
+
+from app.agent.utils import find_resource
+
+
+@dataclass(frozen=True, slots=True)
+class MenuItem:
+    id: str
+    name: str
+    price: float
+    category: str
+
+
+def make_item_id(name: str) -> str:
+    """메뉴 이름 -> 카탈로그 ID (예: "The Gemma Classic" -> "the-gemma-classic")"""
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+def load_menu(filename="menu.json") -> dict:
+    """
+    메뉴 파일을 {카탈로그 ID: MenuItem}으로 로드합니다.
+    메뉴가 없으면 카트 리듀서가 모든 주문을 조용히 버리므로 시작 시점에 실패시킵니다.
+    """
+    path = find_resource(filename)
+    if path is None:
+        raise FileNotFoundError(f"{filename} not found; cart items cannot be resolved")
+
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    if not items:
+        raise ValueError(f"{filename} has no menu items")
+
+    return {
+        make_item_id(item["name"]): MenuItem(
+            id=make_item_id(item["name"]),
+            name=item["name"],
+            price=float(item["price"]),
+            category=item.get("category", ""),
+        )
+        for item in items
+    }
+
+
+# 이름 비교에서 무시하는 단어
+NAME_STOPWORDS = {"the", "a", "an"}
+
+
+def name_tokens(text: str) -> frozenset:
+    """이름 -> 비교용 단어 집합 (소문자, 복수형 s 제거, 관사 제외)"""
+    return frozenset(
+        word[:-1] if word.endswith("s") else word
+        for word in re.findall(r"[a-z0-9]+", text.lower())
+        if word not in NAME_STOPWORDS
+    )
+
+
+# 세션 간에 공유하는 메뉴 인덱스 (카트에는 ID와 수량만 저장하고 가격은 여기서 조회)
+MENU_INDEX = load_menu()
+# 부분 이름 매칭용 단어 집합 ("Gemma Classic Burger"처럼 카테고리를 붙인 이름 포함)
+MENU_TOKENS = {
+    item_id: name_tokens(f"{item.name} {item.category}")
+    for item_id, item in MENU_INDEX.items()
+}
+
+
+def resolve_item_id(name: str | None) -> str | None:
+    """
+    LLM이 추출한 메뉴 이름을 카탈로그 ID로 변환합니다.
+    1. 정확히 같은 이름
+    2. 이름의 단어가 모두 한 메뉴에만 포함 ("fries", "Gemma Classic Burger")
+    3. 약간의 표기 차이 ("The Gemma Clasic")
+    메뉴에 없거나 여러 메뉴에 해당하는 이름("burger")은 None을 반환합니다.
+    """
+    if not name:
+        return None
+
+    item_id = make_item_id(name)
+    if item_id in MENU_INDEX:
+        return item_id
+
+    tokens = name_tokens(name)
+    if tokens:
+        matches = [key for key, words in MENU_TOKENS.items() if tokens <= words]
+        if len(matches) == 1:
+            return matches[0]
+
+    candidates = get_close_matches(item_id, MENU_INDEX.keys(), n=1, cutoff=0.8)
+    return candidates[0] if candidates else None
@@ -1,27 +1,96 @@
-from app.agent.state import AgentState, Intent
-from app.agent.utils import PROMPTS
+import json
+
+from app.agent.state import AgentState, Intent, message_content
+from app.agent.utils import PROMPTS, compile_template, fill_template
 from app.engine import engine
+from app.rag import rag_engine
+
+# 카트 변경을 동반하는 의도 (Fused 노드가 cart delta까지 함께 추출)
+CART_INTENTS = (Intent.ORDER.value, Intent.REMOVE.value)
 
 
 def classify_intent(state: AgentState):
-    last_msg = state["messages"][-1]["content"]
+    last_msg = message_content(state["messages"][-1])
 
     if last_msg == "___INIT_GREETING___":
         print("🧭 [Router] Initial Greeting Triggered")
         return {"current_intent": Intent.GREETING.value}
 
     # YAML에서 라우터 프롬프트 가져오기
-    prompt_template = PROMPTS["router"]["system"]
-    prompt = prompt_template.format(user_message=last_msg)
+    segments = compile_template(PROMPTS["router"]["system"])
+    parts = fill_template(segments, user_message=last_msg)
+    prompt_tokens = engine.encode_prompt_parts(parts)
 
-    response = engine.generate_text(prompt, max_tokens=10, temperature=0.0)
+    response = engine.generate_text(prompt_tokens, max_tokens=10, temperature=0.0)
     intent_raw = response.strip().upper()
 
-    final_intent = Intent.GREETING.value
-    for i in Intent:
-        if i.name in intent_raw:
-            final_intent = i.value
-            break
+    final_intent = parse_intent(intent_raw)
 
     print(f"🧭 [Router] '{last_msg}' -> {intent_raw} -> {final_intent}")
     return {"current_intent": final_intent}
+
+
+def parse_intent(intent_raw: str) -> str:
+    """모델 출력에서 Intent 이름을 찾아 반환 (없으면 GREETING)"""
+    for i in Intent:
+        if i.name in intent_raw:
+            return i.value
+    return Intent.GREETING.value
+
+
+def parse_fused_response(response: str):
+    """
+    Fused 노드 출력({"intent": ..., "cart": [...]})을 검증해 (intent, cart)로
+    반환합니다.
+    JSON이 깨진 경우 의도만이라도 키워드로 복구하고 카트는 비웁니다.
+    """
+    try:
+        start = response.find("{")
+        end = response.rfind("}") + 1
+        if start != -1 and end > start:
+            parsed = json.loads(response[start:end])
+            intent = parse_intent(str(parsed.get("intent", "")).upper())
+            cart = parsed.get("cart", [])
+            if intent not in CART_INTENTS or not isinstance(cart, list):
+                cart = []
+            cart = [item for item in cart if isinstance(item, dict)]
+            return intent, cart
+    except Exception as e:
+        print(f"⚠️ Fused Router Parse Failed: {e}")
+
+    return parse_intent(response.upper()), []
+
+
+def classify_and_extract(state: AgentState):
+    """
+    의도 분류와 카트 추출을 한 번의 생성으로 처리하는 Fused 노드.
+    ORDER/REMOVE 턴의 모델 호출이 3회(분류, 추출, 응답)에서 2회로 줄어듭니다.
+    """
+    messages = state["messages"]
+    last_msg = message_content(messages[-1])
+
+    if last_msg == "___INIT_GREETING___":
+        print("🧭 [Router] Initial Greeting Triggered")
+        return {"current_intent": Intent.GREETING.value}
+
+    prev_ai_msg = message_content(messages[-2]) if len(messages) >= 2 else ""
+
+    search_query = f"{prev_ai_msg} {last_msg}" if prev_ai_msg else last_msg
+    docs = rag_engine.search(
+        search_query, filter={"type": "menu"}, k=10, name_match_k=4
+    )
+
+    segments = compile_template(PROMPTS["router_extraction"]["task"])
+    parts = fill_template(
+        segments,
+        menu_context="\n".join(docs),
+        prev_ai_msg=prev_ai_msg,
+        user_message=last_msg,
+    )
+    prompt_tokens = engine.encode_prompt_parts(parts)
+
+    response = engine.generate_text(prompt_tokens, max_tokens=120, temperature=0.0)
+    final_intent, cart = parse_fused_response(response)
+
+    print(f"🧭 [Fused Router] '{last_msg}' -> {final_intent} (cart: {cart})")
+    return {"current_intent": final_intent, "cart": cart}
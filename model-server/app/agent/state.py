@@ -1,6 +1,8 @@
-import operator
+import sys
 from enum import Enum
-from typing import Annotated, List, TypedDict
+from typing import Annotated, Dict, List, TypedDict
+
+from app.agent.menu import MENU_INDEX, resolve_item_id
 
 
 class Intent(str, Enum):
@@ -14,35 +16,101 @@ class Intent(str, Enum):
     REMOVE = "REMOVE"
 
 
-def reduce_cart(left: List[dict], right: List[dict] | None) -> List[dict]:
-    if right is None:
+# 대화 메시지는 (role, content) 튜플로 저장합니다.
+# dict보다 작고, 체크포인트 직렬화 시 키 문자열을 반복해서 쓰지 않습니다.
+ROLE_USER = sys.intern("user")
+ROLE_ASSISTANT = sys.intern("assistant")
+
+
+def make_message(role: str, content: str) -> tuple:
+    return (sys.intern(role), content)
+
+
+def message_role(message) -> str:
+    return message[0]
+
+
+def message_content(message) -> str:
+    return message[1]
+
+
+def append_messages(left: List[tuple], right: List[tuple] | None) -> List[tuple]:
+    if not right:
         return left
-    if any(item.get("command") == "RESET" for item in right):
-        return []
+    # 체크포인트에서 복원된 레코드는 list가 될 수 있으므로 새 레코드만 튜플로 정규화
+    return left + [make_message(role, content) for role, content in right]
+
 
-    new_cart_map = {item["name"]: dict(item) for item in left}
+def reduce_cart(
+    left: Dict[str, int] | None, right: List[dict] | None
+) -> Dict[str, int]:
+    """
+    카트는 {카탈로그 ID: 수량} 매핑입니다. 가격은 MENU_INDEX에서 조회합니다.
+    업데이트는 [{"name"|"id": ..., "quantity": n}, ...] 또는 [{"command": "RESET"}].
+    바뀐 항목만 갱신하며, 체크포인트가 백그라운드에서 직렬화되는 동안 값이 바뀌지 않도록
+    매핑 자체는 얕은 복사(int 값만 복사) 후 수정합니다.
+    """
+    if left is None:
+        left = {}
+    if not right:
+        return left
 
+    cart = dict(left)
     for update in right:
-        name = update.get("name")
-        if not name:
+        if update.get("command") == "RESET":
+            cart.clear()
+            continue
+
+        item_id = update.get("id")
+        if item_id not in MENU_INDEX:
+            # LLM이 만든 ID는 카탈로그에 없을 수 있으므로 이름처럼 다시 해석
+            item_id = resolve_item_id(update.get("name") or item_id)
+        if item_id is None:
+            print(f"⚠️ Cart item dropped (not on the menu): {update}")
             continue
 
-        qty = update.get("quantity", 0)
-        price = update.get("price", 0.0)
+        qty = cart.get(item_id, 0) + int(update.get("quantity", 0))
+        if qty > 0:
+            cart[item_id] = qty
+        else:
+            cart.pop(item_id, None)
+
+    return cart
 
-        if name in new_cart_map:
-            new_cart_map[name]["quantity"] += qty
-            if new_cart_map[name]["quantity"] <= 0:
-                del new_cart_map[name]
-        elif qty > 0:
-            new_cart_map[name] = {"name": name, "price": price, "quantity": qty}
 
-    return list(new_cart_map.values())
+def cart_items(cart: Dict[str, int] | None) -> List[dict]:
+    """카트를 이름/단가/수량이 채워진 항목 리스트로 펼칩니다 (영수증, 응답용)."""
+    return [
+        {
+            "id": item_id,
+            "name": MENU_INDEX[item_id].name,
+            "price": MENU_INDEX[item_id].price,
+            "quantity": qty,
+        }
+        for item_id, qty in (cart or {}).items()
+        if item_id in MENU_INDEX
+    ]
 
 
 class AgentState(TypedDict):
-    messages: Annotated[List[dict], operator.add]
-    cart: Annotated[List[dict], reduce_cart]
+    messages: Annotated[List[tuple], append_messages]
+    cart: Annotated[Dict[str, int], reduce_cart]
     current_intent: str
     final_response: str
     temperature: float | None
+    # True면 final_response가 프롬프트가 아닌 완성된 응답 (LLM 호출 생략)
+    static_response: bool
+    # [(text, is_static), ...] 형태의 프롬프트 조각 (엔진이 정적 조각 토큰을 캐시)
+    prompt_parts: List[tuple] | None
+
+
+def make_input_state(message: str) -> dict:
+    """한 턴의 입력 상태. 리듀서가 없는 필드는 이전 턴 값이 남지 않도록 초기화합니다."""
+    return {
+        "messages": [make_message(ROLE_USER, message)],
+        "cart": [],
+        "current_intent": Intent.GREETING.value,
+        "final_response": "",
+        "static_response": False,
+        "prompt_parts": None,
+    }
@@ -1,10 +1,12 @@
 import os
+from functools import lru_cache
+from string import Formatter
 
 import yaml
 
 
-def load_yaml(filename):
-    """프로젝트 루트 또는 리소스 폴더에서 YAML 파일을 찾습니다."""
+def find_resource(filename):
+    """프로젝트 루트 또는 리소스 폴더에서 파일 경로를 찾습니다. 없으면 None."""
     # 현재 파일(app/agent/utils.py) 기준으로 루트 경로 추적
     base_path = os.path.dirname(__file__)
     # 예: app/agent/ -> app/ -> root/
@@ -18,6 +20,15 @@ def load_yaml(filename):
 
     if not os.path.exists(path):
         print(f"⚠️ Warning: {filename} not found at {path}")
+        return None
+
+    return path
+
+
+def load_yaml(filename):
+    """프로젝트 루트 또는 리소스 폴더에서 YAML 파일을 찾습니다."""
+    path = find_resource(filename)
+    if path is None:
         return {}
 
     with open(path, "r", encoding="utf-8") as f:
@@ -29,17 +40,93 @@ PERSONAS = load_yaml("personas.yaml")
 PROMPTS = load_yaml("prompts.yaml")
 
 
-def build_prompt(persona_key, task_instruction, context_data, user_query):
-    """prompts.yaml의 common 템플릿을 사용하여 프롬프트를 조립합니다."""
+@lru_cache(maxsize=128)
+def compile_template(template, static_items=()):
+    """
+    템플릿을 정적 세그먼트와 슬롯으로 미리 분해합니다.
+    static_items로 주어진 값(페르소나, 태스크 등)은 정적 텍스트에 합쳐지고,
+    나머지 필드는 요청마다 채워지는 슬롯으로 남습니다.
+    슬롯에 인접한 공백은 슬롯 쪽으로 옮깁니다. SentencePiece 계열 토크나이저는 공백을
+    다음 단어에 붙이므로("Query: " + "I" -> "▁I"), 조각별 토큰화가 전체 문자열
+    토큰화와 같아지려면 공백이 슬롯 값과 함께 토큰화되어야 합니다.
+    반환값: ((text, None) | ((leading, trailing), slot_name), ...) 튜플
+    """
+    static_values = dict(static_items)
+    segments = []
+    buffer = ""
+
+    # Chat template이 content를 trim 하므로 여기서도 앞뒤 공백을 제거
+    for literal, field, spec, _ in Formatter().parse(template.strip()):
+        buffer += literal
+        if field is None:
+            continue
+        if field in static_values:
+            buffer += format(static_values[field], spec or "")
+            continue
+        if buffer:
+            segments.append((buffer, None))
+            buffer = ""
+        segments.append(("", field))
+
+    if buffer:
+        segments.append((buffer, None))
+
+    for i, (text, slot) in enumerate(segments):
+        if slot is None:
+            continue
+        leading = trailing = ""
+        if i > 0 and segments[i - 1][1] is None:
+            prev = segments[i - 1][0]
+            leading = prev[len(prev.rstrip()) :]
+            segments[i - 1] = (prev.rstrip(), None)
+        if i + 1 < len(segments) and segments[i + 1][1] is None:
+            nxt = segments[i + 1][0]
+            trailing = nxt[: len(nxt) - len(nxt.lstrip())]
+            segments[i + 1] = (nxt.lstrip(), None)
+        segments[i] = ((leading, trailing), slot)
+
+    return tuple(seg for seg in segments if seg[1] is not None or seg[0])
+
+
+def fill_template(segments, **slots):
+    """
+    컴파일된 템플릿의 슬롯을 채워 [(text, is_static), ...] 리스트를 만듭니다.
+    is_static=True인 조각은 엔진에서 토큰화 결과가 캐시됩니다.
+    """
+    parts = []
+    for text, slot in segments:
+        if slot is None:
+            parts.append((text, True))
+        else:
+            leading, trailing = text
+            parts.append((f"{leading}{slots[slot]}{trailing}", False))
+    return parts
+
+
+def render_prompt(parts):
+    """프롬프트 조각들을 하나의 문자열로 합칩니다."""
+    return "".join(text for text, _ in parts)
+
+
+def build_prompt_parts(persona_key, task_instruction, context_data, user_query):
+    """common 템플릿을 정적 조각 + 가변 조각(context, query)으로 조립합니다."""
     p = PERSONAS.get(persona_key, PERSONAS.get("rosy"))
     template = PROMPTS["common"]["base_template"]
 
-    return template.format(
-        name=p["name"],
-        description=p["description"],
-        task_instruction=task_instruction,
-        context_data=context_data,
-        style=p["style"],
-        prefix=p["prefix"],
-        user_query=user_query,
+    static_items = (
+        ("name", p["name"]),
+        ("description", p["description"]),
+        ("task_instruction", task_instruction),
+        ("style", p["style"]),
+        ("prefix", p["prefix"]),
+    )
+    segments = compile_template(template, static_items)
+
+    return fill_template(segments, context_data=context_data, user_query=user_query)
+
+
+def build_prompt(persona_key, task_instruction, context_data, user_query):
+    """prompts.yaml의 common 템플릿을 사용하여 프롬프트를 조립합니다."""
+    return render_prompt(
+        build_prompt_parts(persona_key, task_instruction, context_data, user_query)
     )
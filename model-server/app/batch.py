@@ -0,0 +1,166 @@
+import os
+import time
+import traceback
+import uuid
+from collections import Counter
+
+from app.agent import agent_app
+from app.agent.state import (
+    ROLE_ASSISTANT,
+    cart_items,
+    make_input_state,
+    make_message,
+)
+from app.engine import engine
+
+# generate_batch 한 번에 넣을 최대 대화 수
+# 호출마다 엔진 락을 잡으므로, 나눠서 호출하면 그 사이에 인터랙티브 /chat이 실행됨
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "8"))
+
+
+class BatchError(Exception):
+    """배치 실행 중 실패. 완료된 턴까지의 대화 기록과 통계를 함께 전달합니다."""
+
+    def __init__(self, message: str, transcripts: list, stats: dict):
+        super().__init__(message)
+        self.transcripts = transcripts
+        self.stats = stats
+
+
+def _run_graph(session_id: str, message: str):
+    config = {"configurable": {"thread_id": session_id}}
+    started = time.perf_counter()
+    result = agent_app.invoke(make_input_state(message), config=config)
+    return config, result, (time.perf_counter() - started) * 1000
+
+
+def run_batch(conversations: list, adapter: str | None = None, max_tokens: int = 500):
+    """
+    여러 독립 대화 스크립트를 턴 단위로 나란히 실행합니다.
+    각 턴마다 모든 대화의 그래프(라우터/핸들러)를 돌린 뒤,
+    LLM 응답 생성은 같은 온도끼리 묶어 BATCH_CHUNK_SIZE개씩 engine.generate_batch로
+    처리합니다.
+
+    conversations: [{"id": str | None, "messages": [str, ...]}, ...]
+    반환값: (transcripts, stats)
+    실패하면 응답까지 완료된 턴만 남긴 기록과 함께 BatchError를 발생시킵니다.
+    """
+    batch_id = uuid.uuid4().hex[:8]
+    sessions = [f"batch-{batch_id}-{i}" for i in range(len(conversations))]
+    transcripts = [
+        {"id": conv.get("id") or sessions[i], "turns": []}
+        for i, conv in enumerate(conversations)
+    ]
+
+    started = time.perf_counter()
+    generated_tokens = 0
+    # Static fast-path로 생략된 LLM 호출 수 (의도별, /stats/fast-path와 같은 기준)
+    model_calls_avoided = Counter()
+    max_turns = max((len(conv["messages"]) for conv in conversations), default=0)
+
+    try:
+        for turn in range(max_turns):
+            active = [
+                i
+                for i, conv in enumerate(conversations)
+                if turn < len(conv["messages"])
+            ]
+
+            # 1. 그래프 실행 (의도 분류, 카트 업데이트, 프롬프트 조립)
+            pending = {}
+            for i in active:
+                message = conversations[i]["messages"][turn]
+                config, result, graph_ms = _run_graph(sessions[i], message)
+                pending[i] = (config, result)
+                transcripts[i]["turns"].append(
+                    {
+                        "user": message,
+                        "intent": result.get("current_intent"),
+                        "static": bool(result.get("static_response")),
+                        # 생성은 청크 단위로 한 번에 하므로 턴별 시간이 아니라
+                        # 청크 전체 시간과 청크 크기를 함께 기록
+                        "timings": {
+                            "graph_ms": graph_ms,
+                            "batch_generate_ms": 0.0,
+                            "batch_size": 0,
+                        },
+                    }
+                )
+
+            # 2. 응답 생성: 정적 응답은 그대로, 나머지는 온도별로 묶어서 배치 생성
+            responses = {}
+            groups = {}
+            for i, (_, result) in pending.items():
+                if result.get("static_response"):
+                    responses[i] = result["final_response"]
+                    model_calls_avoided[result.get("current_intent")] += 1
+                    continue
+                prompt_parts = result.get("prompt_parts")
+                prompt = (
+                    engine.encode_prompt_parts(prompt_parts)
+                    if prompt_parts
+                    else result["final_response"]
+                )
+                temperature = result.get("temperature", 0.7)
+                groups.setdefault(temperature, []).append((i, prompt))
+
+            for temperature, items in groups.items():
+                for start in range(0, len(items), BATCH_CHUNK_SIZE):
+                    chunk = items[start : start + BATCH_CHUNK_SIZE]
+                    generate_started = time.perf_counter()
+                    texts = engine.generate_batch(
+                        [prompt for _, prompt in chunk],
+                        adapters=[adapter] * len(chunk),
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                    )
+                    generate_ms = (time.perf_counter() - generate_started) * 1000
+                    for (i, _), text in zip(chunk, texts):
+                        responses[i] = text
+                        timings = transcripts[i]["turns"][-1]["timings"]
+                        timings["batch_generate_ms"] = generate_ms
+                        timings["batch_size"] = len(chunk)
+                        generated_tokens += len(engine.tokenizer.encode(text))
+
+            # 3. 응답을 대화 기록에 저장하고 턴 결과 기록
+            for i, (config, _) in pending.items():
+                agent_app.update_state(
+                    config,
+                    {"messages": [make_message(ROLE_ASSISTANT, responses[i])]},
+                )
+                state = agent_app.get_state(config).values
+                transcripts[i]["turns"][-1].update(
+                    {"response": responses[i], "cart": cart_items(state.get("cart"))}
+                )
+    except Exception as e:
+        print(f"❌ Batch failed: {str(e)}")
+        traceback.print_exc()
+        # 응답까지 완료된 턴만 남김
+        for transcript in transcripts:
+            transcript["turns"] = [t for t in transcript["turns"] if "response" in t]
+        stats = _batch_stats(
+            transcripts, started, generated_tokens, model_calls_avoided
+        )
+        raise BatchError(str(e), transcripts, stats) from e
+    finally:
+        # 배치 세션은 일회성이므로 체크포인트에서 제거
+        for session_id in sessions:
+            agent_app.checkpointer.delete_thread(session_id)
+
+    return transcripts, _batch_stats(
+        transcripts, started, generated_tokens, model_calls_avoided
+    )
+
+
+def _batch_stats(
+    transcripts: list, started: float, generated_tokens: int, model_calls_avoided
+) -> dict:
+    elapsed = time.perf_counter() - started
+    return {
+        "conversations": len(transcripts),
+        "turns": sum(len(t["turns"]) for t in transcripts),
+        "generated_tokens": generated_tokens,
+        "elapsed_seconds": elapsed,
+        "tokens_per_sec": generated_tokens / elapsed if elapsed else 0.0,
+        "model_calls_avoided": dict(model_calls_avoided),
+    }
@@ -0,0 +1,392 @@
+import asyncio
+import bisect
+import hashlib
+import os
+import time
+from collections import Counter, OrderedDict
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+from starlette.background import BackgroundTask
+
+# 세션을 나눠 받을 model-server 워커 목록 (쉼표로 구분)
+MODEL_SERVER_WORKERS = os.getenv(
+    "MODEL_SERVER_WORKERS", "http://127.0.0.1:8001,http://127.0.0.1:8002"
+)
+# 워커당 가상 노드 수 (많을수록 세션이 고르게 분산됨)
+VIRTUAL_NODES = int(os.getenv("DISPATCHER_VIRTUAL_NODES", "128"))
+# 세션 수/리밸런싱 통계용으로 기억할 최근 세션 수와 유지 시간(초)
+MAX_TRACKED_SESSIONS = int(os.getenv("DISPATCHER_MAX_SESSIONS", "10000"))
+SESSION_TTL_SECONDS = float(os.getenv("DISPATCHER_SESSION_TTL", "3600"))
+# 워커 헬스 체크 주기(초, 0이면 끔)와 응답 대기 시간
+HEALTH_CHECK_INTERVAL = float(os.getenv("DISPATCHER_HEALTH_INTERVAL", "10"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("DISPATCHER_HEALTH_TIMEOUT", "2"))
+# 헬스 체크로 호출할 워커 API (모델을 쓰지 않는 가벼운 조회)
+HEALTH_CHECK_PATH = "/adapters"
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    session_id -> 워커 매핑을 위한 consistent hash ring.
+    워커가 추가/제거되면 해당 워커 구간의 세션(약 1/N)만 다른 워커로 이동합니다.
+    """
+
+    def __init__(self, virtual_nodes: int = VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self.workers = []
+        self._keys = []
+        self._nodes = []
+
+    def add(self, worker: str):
+        if worker in self.workers:
+            return
+        self.workers.append(worker)
+        for i in range(self.virtual_nodes):
+            key = _hash(f"{worker}#{i}")
+            index = bisect.bisect(self._keys, key)
+            self._keys.insert(index, key)
+            self._nodes.insert(index, worker)
+
+    def remove(self, worker: str):
+        if worker not in self.workers:
+            return
+        self.workers.remove(worker)
+        ring = [(k, n) for k, n in zip(self._keys, self._nodes) if n != worker]
+        self._keys = [k for k, _ in ring]
+        self._nodes = [n for _, n in ring]
+
+    def get(self, session_id: str) -> str | None:
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(session_id)) % len(self._keys)
+        return self._nodes[index]
+
+
+class DispatchRequest(BaseModel):
+    message: str
+    session_id: str = "default_guest"
+    adapter: str | None = None
+
+
+class WorkerRequest(BaseModel):
+    url: str
+
+
+ring = HashRing()
+# 워커별 부하 지표
+shard_stats = {}
+# 최근 요청한 세션 (session_id -> (마지막 요청 시각, 대화 상태가 있는 워커), 오래된 순)
+# 워커는 세션이 이동했는지 판단하는 데만 쓰고, 집계는 ring.get()으로 계산
+# (이동한 세션이 중복 집계되지 않음)
+recent_sessions = OrderedDict()
+# 헬스 체크에 실패해 ring에서 빠진 워커 (복구되면 다시 추가)
+unhealthy_workers = set()
+
+
+def _new_shard_stats() -> dict:
+    return {"in_flight": 0, "requests": 0, "errors": 0}
+
+
+def add_worker(url: str):
+    ring.add(url)
+    shard_stats.setdefault(url, _new_shard_stats())
+
+
+def touch_session(session_id: str, worker: str, now: float | None = None):
+    now = time.monotonic() if now is None else now
+    recent_sessions[session_id] = (now, worker)
+    recent_sessions.move_to_end(session_id)
+    _expire_sessions(now)
+
+
+def pinned_worker(session_id: str) -> str | None:
+    """세션의 대화 상태(MemorySaver)를 가진 워커 (기록이 없으면 None)"""
+    if session_id not in recent_sessions:
+        return None
+    return recent_sessions[session_id][1]
+
+
+def _expire_sessions(now: float):
+    """개수 상한을 넘거나 TTL이 지난 세션을 오래된 순으로 제거"""
+    while recent_sessions:
+        last_seen, _ = next(iter(recent_sessions.values()))
+        if (
+            len(recent_sessions) <= MAX_TRACKED_SESSIONS
+            and now - last_seen <= SESSION_TTL_SECONDS
+        ):
+            break
+        recent_sessions.popitem(last=False)
+
+
+def _session_owners() -> dict:
+    _expire_sessions(time.monotonic())
+    return {session_id: ring.get(session_id) for session_id in recent_sessions}
+
+
+def _moved_sessions(before: dict) -> int:
+    """리밸런싱 후 다른 워커로 옮겨진 (최근) 세션 수"""
+    return sum(ring.get(session_id) != worker for session_id, worker in before.items())
+
+
+def _rebalance(change) -> int:
+    """ring을 변경하고 다른 워커로 옮겨진 최근 세션 수를 반환"""
+    before = _session_owners()
+    change()
+    return _moved_sessions(before)
+
+
+for worker_url in filter(None, MODEL_SERVER_WORKERS.split(",")):
+    add_worker(worker_url.strip())
+
+app = FastAPI(title="Gemma Agent Dispatcher")
+client = httpx.AsyncClient(timeout=httpx.Timeout(None, connect=5.0))
+health_task = None
+
+
+async def check_workers():
+    """
+    활성 워커와 빠져 있는 워커에 헬스 체크 요청을 보냅니다.
+    응답하지 않는 워커는 ring에서 빼고, 다시 응답하면 ring에 추가합니다.
+    """
+    workers = list(ring.workers) + sorted(unhealthy_workers)
+    results = await asyncio.gather(*(_probe(worker) for worker in workers))
+    for worker, healthy in zip(workers, results):
+        if not healthy and worker in ring.workers:
+            unhealthy_workers.add(worker)
+            moved = _rebalance(lambda: ring.remove(worker))
+            print(f"🚑 [Dispatcher] {worker} is down, removed ({moved} sessions moved)")
+        elif healthy and worker in unhealthy_workers:
+            unhealthy_workers.discard(worker)
+            moved = _rebalance(lambda: add_worker(worker))
+            print(f"💚 [Dispatcher] {worker} recovered ({moved} sessions moved)")
+
+
+async def _probe(worker: str) -> bool:
+    try:
+        response = await client.get(
+            f"{worker}{HEALTH_CHECK_PATH}", timeout=HEALTH_CHECK_TIMEOUT
+        )
+    except httpx.HTTPError:
+        return False
+    return response.status_code == 200
+
+
+async def _health_loop():
+    while True:
+        await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+        try:
+            await check_workers()
+        except Exception as e:
+            print(f"⚠️ [Dispatcher] Health check failed: {e}")
+
+
+@app.on_event("startup")
+async def start_health_check():
+    global health_task
+    if HEALTH_CHECK_INTERVAL > 0:
+        health_task = asyncio.create_task(_health_loop())
+
+
+@app.on_event("shutdown")
+async def close_client():
+    if health_task is not None:
+        health_task.cancel()
+    await client.aclose()
+
+
+@app.post("/chat")
+async def chat_endpoint(req: DispatchRequest):
+    """
+    session_id로 워커를 고정하여 요청을 전달하고 스트리밍 응답을 그대로 중계합니다.
+    대화 상태(장바구니, 대화 기록)는 워커 프로세스 메모리에만 있으므로,
+    리밸런싱으로 세션이 다른 워커로 옮겨지면 409를 반환해 클라이언트가 주문을
+    처음부터 다시 시작하도록 알립니다. 이후 요청은 새 워커에서 빈 상태로 이어집니다.
+    """
+    worker = ring.get(req.session_id)
+    if worker is None:
+        raise HTTPException(status_code=503, detail="No model-server workers")
+
+    previous = pinned_worker(req.session_id)
+    touch_session(req.session_id, worker)
+    if previous is not None and previous != worker:
+        print(f"🔀 [Dispatcher] Session {req.session_id} moved: {previous} -> {worker}")
+        raise HTTPException(
+            status_code=409,
+            detail=(
+                "Session moved to another worker and its cart and conversation "
+                "were lost. Please start the order again."
+            ),
+        )
+
+    stats = shard_stats[worker]
+    stats["requests"] += 1
+
+    upstream = client.build_request(
+        "POST", f"{worker}/chat", json=req.model_dump(exclude_none=True)
+    )
+    try:
+        response = await client.send(upstream, stream=True)
+    except httpx.HTTPError as e:
+        stats["errors"] += 1
+        print(f"❌ [Dispatcher] {worker} unreachable: {e}")
+        raise HTTPException(status_code=502, detail=f"Worker unreachable: {worker}")
+
+    if response.status_code != 200:
+        stats["errors"] += 1
+        content = await response.aread()
+        await response.aclose()
+        return Response(
+            content,
+            status_code=response.status_code,
+            media_type=response.headers.get("content-type"),
+        )
+
+    async def relay():
+        # 본문 전송이 시작되기 전에 클라이언트가 끊으면 제너레이터가 실행되지 않으므로
+        # in_flight는 여기서 증가시키고, upstream 응답은 background task로도 닫습니다.
+        stats["in_flight"] += 1
+        try:
+            async for chunk in response.aiter_raw():
+                yield chunk
+        finally:
+            stats["in_flight"] -= 1
+            await response.aclose()
+
+    return StreamingResponse(
+        relay(), media_type="text/plain", background=BackgroundTask(response.aclose)
+    )
+
+
+async def _forward(worker: str, request: Request, body: bytes) -> httpx.Response:
+    """요청을 method/경로/쿼리/본문 그대로 워커에 전달 (스트리밍 없음)"""
+    stats = shard_stats[worker]
+    stats["requests"] += 1
+    stats["in_flight"] += 1
+    try:
+        response = await client.request(
+            request.method,
+            f"{worker}{request.url.path}",
+            params=request.query_params,
+            content=body,
+            headers={"content-type": request.headers.get("content-type", "")},
+        )
+    except httpx.HTTPError as e:
+        stats["errors"] += 1
+        print(f"❌ [Dispatcher] {worker} unreachable: {e}")
+        raise HTTPException(status_code=502, detail=f"Worker unreachable: {worker}")
+    finally:
+        stats["in_flight"] -= 1
+
+    if response.status_code >= 400:
+        stats["errors"] += 1
+    return response
+
+
+@app.post("/chat/batch")
+async def chat_batch_endpoint(request: Request):
+    """
+    배치는 요청마다 격리된 세션을 쓰므로 세션 고정 없이
+    진행 중 요청이 가장 적은 워커로 전달합니다.
+    """
+    if not ring.workers:
+        raise HTTPException(status_code=503, detail="No model-server workers")
+
+    worker = min(ring.workers, key=lambda url: shard_stats[url]["in_flight"])
+    response = await _forward(worker, request, await request.body())
+    return Response(
+        response.content,
+        status_code=response.status_code,
+        media_type=response.headers.get("content-type"),
+    )
+
+
+@app.api_route("/adapters", methods=["GET", "POST"])
+@app.get("/stats/{name}")
+@app.get("/debug/memory")
+async def broadcast_endpoint(request: Request):
+    """
+    어댑터, 통계, 메모리는 워커 프로세스마다 따로 있으므로 모든 활성 워커에 전달하고
+    워커별 응답을 모아 반환합니다. (어댑터 등록은 모든 워커에 적용)
+    하나라도 실패하면 502와 함께 워커별 결과를 반환합니다.
+    """
+    if not ring.workers:
+        raise HTTPException(status_code=503, detail="No model-server workers")
+
+    workers = list(ring.workers)
+    body = await request.body()
+    results = await asyncio.gather(
+        *(_forward(worker, request, body) for worker in workers),
+        return_exceptions=True,
+    )
+
+    merged = {}
+    failed = False
+    for worker, result in zip(workers, results):
+        if isinstance(result, HTTPException):
+            merged[worker] = {
+                "status_code": result.status_code,
+                "detail": result.detail,
+            }
+            failed = True
+            continue
+        if isinstance(result, BaseException):
+            raise result
+        try:
+            content = result.json()
+        except ValueError:
+            content = result.text
+        merged[worker] = {"status_code": result.status_code, "body": content}
+        failed = failed or result.status_code != 200
+
+    return JSONResponse(merged, status_code=502 if failed else 200)
+
+
+@app.get("/shards")
+def shard_load():
+    """워커별 부하 (진행 중 요청, 누적 요청, 에러, 최근 세션 수)"""
+    sessions = Counter(_session_owners().values())
+    return {
+        worker: {
+            "in_flight": stats["in_flight"],
+            "requests": stats["requests"],
+            "errors": stats["errors"],
+            "sessions": sessions[worker],
+            "active": worker in ring.workers,
+            "healthy": worker not in unhealthy_workers,
+        }
+        for worker, stats in shard_stats.items()
+    }
+
+
+@app.post("/workers")
+def join_worker(req: WorkerRequest):
+    """워커 추가: 새 워커 구간에 해당하는 세션만 이동"""
+    unhealthy_workers.discard(req.url)
+    moved = _rebalance(lambda: add_worker(req.url))
+    print(f"➕ [Dispatcher] {req.url} joined ({moved} sessions moved)")
+    return {"workers": ring.workers, "moved_sessions": moved}
+
+
+@app.delete("/workers")
+def leave_worker(url: str):
+    """워커 제거: 해당 워커의 세션만 나머지 워커로 재배치"""
+    if url not in ring.workers and url not in unhealthy_workers:
+        raise HTTPException(status_code=404, detail=f"Unknown worker: {url}")
+
+    # 헬스 체크가 다시 추가하지 않도록 비정상 목록에서도 제거
+    unhealthy_workers.discard(url)
+    moved = _rebalance(lambda: ring.remove(url))
+    print(f"➖ [Dispatcher] {url} left ({moved} sessions moved)")
+    return {"workers": ring.workers, "moved_sessions": moved}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("app.dispatcher:app", host="0.0.0.0", port=8000)
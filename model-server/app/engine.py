@@ -1,11 +1,83 @@
+import copy
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+
 import mlx.core as mx
-from mlx_lm import generate, load, stream_generate
+from mlx.utils import tree_flatten
+from mlx_lm import batch_generate, generate, load
+from mlx_lm.generate import generate_step, speculative_generate_step
+from mlx_lm.models.cache import make_prompt_cache
 from mlx_lm.sample_utils import make_sampler
+from mlx_lm.tuner.utils import linear_to_lora_layers
+
+from app.speculative import (
+    cache_window,
+    count_draft_passes,
+    prompt_lookup_generate_step,
+)
 
 mx.set_default_device(mx.gpu)
 
 MODEL_ID = "mlx-community/gemma-3-4b-it-4bit"
 
+# 정적 프롬프트 조각 토큰 캐시 크기 (페르소나 x 태스크 조합 수보다 넉넉하게)
+STATIC_TOKEN_CACHE_SIZE = 256
+
+# 어댑터 없이 베이스 모델로 생성할 때 사용하는 이름
+BASE_ADAPTER = "base"
+ADAPTER_WEIGHTS_FILE = "adapters.safetensors"
+ADAPTER_CONFIG_FILE = "adapter_config.json"
+
+# 시작 시 등록할 어댑터 목록 (예: "burger=adapters,exp2=adapters_exp2")
+LORA_ADAPTERS = os.getenv("LORA_ADAPTERS", "burger=adapters")
+# 요청에서 어댑터를 지정하지 않았을 때 사용할 어댑터
+DEFAULT_ADAPTER = os.getenv("DEFAULT_ADAPTER", BASE_ADAPTER)
+
+# 스펙큘레이티브 디코딩: off | draft (작은 드래프트 모델) | prompt_lookup (n-gram)
+SPECULATIVE_MODES = ("off", "draft", "prompt_lookup")
+SPECULATIVE_MODE = os.getenv("SPECULATIVE_MODE", "off")
+SPECULATIVE_DRAFT_MODEL = os.getenv(
+    "SPECULATIVE_DRAFT_MODEL", "mlx-community/gemma-3-1b-it-4bit"
+)
+NUM_DRAFT_TOKENS = int(os.getenv("NUM_DRAFT_TOKENS", "4"))
+
+
+def _new_spec_stats() -> dict:
+    return {
+        "generated_tokens": 0,
+        "decode_tokens": 0,
+        "decode_seconds": 0.0,
+        "from_draft_tokens": 0,
+        "drafted_tokens": 0,
+        "target_passes": 0,
+    }
+
+
+def _check_speculative_mode(mode: str) -> str:
+    if mode not in SPECULATIVE_MODES:
+        raise ValueError(
+            f"Unknown speculative mode: {mode} (expected one of {SPECULATIVE_MODES})"
+        )
+    return mode
+
+
+def _validate_adapter_config(config: dict, config_path: str):
+    """LoRA 레이어 설치에 필요한 키가 없으면 KeyError 대신 ValueError를 냅니다."""
+    if not isinstance(config, dict):
+        raise ValueError(f"{config_path}: expected a JSON object")
+    lora_parameters = config.get("lora_parameters")
+    if not isinstance(lora_parameters, dict):
+        raise ValueError(f"{config_path}: missing 'lora_parameters'")
+
+    missing = [key for key in ("rank", "scale") if key not in lora_parameters]
+    if "num_layers" not in config:
+        missing.insert(0, "num_layers")
+    if missing:
+        raise ValueError(f"{config_path}: missing {', '.join(missing)}")
+
 
 class LLMEngine:
     def __init__(self):
@@ -13,49 +85,352 @@ class LLMEngine:
         self.tokenizer = None
         print(f"🚀 Loading model: {MODEL_ID}...")
 
+        # 베이스 가중치는 한 번만 로드하고, LoRA 어댑터는 가중치만 교체하여 공유합니다.
         self.model, self.tokenizer = load(MODEL_ID)
-        # adapter_path = "adapters"
 
-        # if os.path.exists(adapter_path):
-        #     print(f"✨ Found adapter at '{adapter_path}'. Loading with LoRA...")
-        #     self.model, self.tokenizer = load(MODEL_ID, adapter_path=adapter_path)
-        # else:
-        #     print("⚠️ Adapter not found. Loading base model only.")
-        #     self.model, self.tokenizer = load(MODEL_ID)
+        # 생성/어댑터 교체를 직렬화하는 락 (MLX 모델은 스레드 안전하지 않음)
+        self._lock = threading.Lock()
+        self.adapters = {}  # name -> LoRA 가중치 dict
+        self.adapter_paths = {}  # name -> 어댑터 디렉토리
+        self._lora_signature = None  # 모델에 설치된 LoRA 레이어 구조
+        # lora_b를 0으로 채운 가중치 (+ DoRA면 초기 magnitude) = 베이스 모델
+        self._base_weights = {}
+        self._active_adapter = BASE_ADAPTER
+        self.default_adapter = BASE_ADAPTER
+
+        for entry in filter(None, LORA_ADAPTERS.split(",")):
+            name, _, adapter_path = entry.partition("=")
+            try:
+                self.register_adapter(name.strip(), adapter_path.strip())
+            except (FileNotFoundError, ValueError) as e:
+                print(f"⚠️ Adapter '{name}' skipped: {e}")
+
+        if DEFAULT_ADAPTER in self.adapters:
+            self.default_adapter = DEFAULT_ADAPTER
+
+        # 드래프트 모델은 타겟과 같은 토크나이저(Gemma 3 계열)를 써야 합니다.
+        self.draft_model = None
+        self.speculative_mode = _check_speculative_mode(SPECULATIVE_MODE)
+        self.spec_stats = {}
+        # Gemma 3의 sliding window 레이어는 RotatingKVCache를 쓰므로 윈도우 크기를 기록
+        self._cache_window = cache_window(make_prompt_cache(self.model))
+        if self.speculative_mode == "draft":
+            print(f"🚀 Loading draft model: {SPECULATIVE_DRAFT_MODEL}...")
+            self.draft_model, _ = load(SPECULATIVE_DRAFT_MODEL)
+
+        print(
+            f"✅ Model loaded successfully! (default adapter: {self.default_adapter})"
+        )
+
+        # Chat template의 앞/뒤 고정 부분을 한 번만 렌더링 & 토큰화
+        self._chat_head, self._chat_tail = self._compile_chat_template()
+        self._encode_static = lru_cache(maxsize=STATIC_TOKEN_CACHE_SIZE)(
+            self._encode_tuple
+        )
 
-        print("✅ Model loaded successfully!")
+    def _read_adapter(self, adapter_path: str):
+        config_path = os.path.join(adapter_path, ADAPTER_CONFIG_FILE)
+        weights_path = os.path.join(adapter_path, ADAPTER_WEIGHTS_FILE)
+        if not os.path.exists(weights_path):
+            raise FileNotFoundError(f"{weights_path} not found")
+
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        _validate_adapter_config(config, config_path)
+
+        return config, mx.load(weights_path)
+
+    def _ensure_lora_layers(self, config: dict, weights: dict):
+        """
+        첫 어댑터 등록 시 모델에 LoRA 레이어를 설치합니다.
+        이후 어댑터는 같은 구조(레이어 수, rank, scale, 대상 키)여야
+        가중치만 교체할 수 있습니다.
+        """
+        lora_parameters = config["lora_parameters"]
+        signature = (
+            config.get("fine_tune_type", "lora"),
+            config["num_layers"],
+            lora_parameters["rank"],
+            lora_parameters["scale"],
+            tuple(sorted(lora_parameters.get("keys") or ())),
+        )
+
+        if self._lora_signature is None:
+            linear_to_lora_layers(
+                self.model,
+                config["num_layers"],
+                lora_parameters,
+                use_dora=signature[0] == "dora",
+            )
+            self.model.eval()
+            self._lora_signature = signature
+            self._base_weights = {
+                key: mx.zeros_like(value)
+                for key, value in weights.items()
+                if key.endswith("lora_b")
+            }
+            if signature[0] == "dora":
+                # DoRA는 magnitude 벡터(m)도 출력을 바꾸므로, 어댑터를 올리기 전
+                # 설치 직후의 값(= 베이스 가중치의 norm)을 함께 보관해 복원합니다.
+                params = dict(tree_flatten(self.model.parameters()))
+                self._base_weights.update(
+                    {key: params[key] for key in weights if key.endswith(".m")}
+                )
+        elif signature != self._lora_signature:
+            raise ValueError(
+                f"LoRA structure {signature} does not match loaded adapters "
+                f"{self._lora_signature}"
+            )
+
+    def register_adapter(self, name: str, adapter_path: str):
+        """
+        어댑터를 등록하거나, 같은 이름이면 새 디렉토리로 핫 리로드합니다.
+        디스크 읽기는 락 밖에서 하므로 진행 중인 생성이 멈추지 않습니다.
+        """
+        if name == BASE_ADAPTER:
+            raise ValueError(f"'{BASE_ADAPTER}' is reserved for the base model")
+
+        config, weights = self._read_adapter(adapter_path)
+
+        with self._lock:
+            self._ensure_lora_layers(config, weights)
+            self.adapters[name] = weights
+            self.adapter_paths[name] = adapter_path
+            # 활성 어댑터를 교체한 경우 다음 스텝에서 새 가중치를 적용
+            if self._active_adapter == name:
+                self._active_adapter = None
+
+        print(f"✨ Adapter '{name}' registered from '{adapter_path}'")
+
+    def list_adapters(self) -> dict:
+        return {
+            "default": self.default_adapter,
+            "active": self._active_adapter,
+            "adapters": {BASE_ADAPTER: None, **self.adapter_paths},
+        }
+
+    def has_adapter(self, name: str | None) -> bool:
+        return name is None or name == BASE_ADAPTER or name in self.adapters
+
+    def _activate(self, adapter: str | None):
+        """(락을 잡은 상태에서) 요청한 어댑터의 LoRA 가중치를 모델에 적용합니다."""
+        name = adapter or self.default_adapter
+        if name == self._active_adapter:
+            return
+        if not self.has_adapter(name):
+            raise ValueError(f"Unknown adapter: {name}")
+
+        weights = self._base_weights if name == BASE_ADAPTER else self.adapters[name]
+        if weights:
+            self.model.load_weights(list(weights.items()), strict=False)
+        self._active_adapter = name
+
+    def _encode(self, text: str) -> list:
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def _encode_tuple(self, text: str) -> tuple:
+        return tuple(self._encode(text))
+
+    def _compile_chat_template(self):
+        """
+        user 메시지 하나짜리 chat template을 sentinel로 렌더링한 뒤
+        sentinel 앞/뒤 문자열을 토큰화하여 (head, tail) 토큰으로 반환합니다.
+        """
+        sentinel = "__GEMMA_BURGER_PROMPT__"
+        rendered = self.tokenizer.apply_chat_template(
+            [{"role": "user", "content": sentinel}],
+            tokenize=False,
+            add_generation_prompt=True,
+        )
+        head, tail = rendered.split(sentinel, 1)
+        return tuple(self._encode(head)), tuple(self._encode(tail))
+
+    def encode_prompt_parts(self, parts) -> list:
+        """
+        [(text, is_static), ...] 프롬프트 조각을 chat template이 적용된 토큰 ID로
+        변환합니다. 정적 조각(페르소나, 태스크, 템플릿 본문)은 캐시된 토큰을 재사용하고,
+        가변 조각(context, user query)만 요청마다 토큰화합니다.
+        """
+        parts = [(text, is_static) for text, is_static in parts if text]
+        # chat template은 content 앞뒤 공백을 trim 하므로 양 끝 조각에도 동일하게 적용
+        if parts:
+            parts[0] = (parts[0][0].lstrip(), parts[0][1])
+            parts[-1] = (parts[-1][0].rstrip(), parts[-1][1])
+
+        tokens = list(self._chat_head)
+        for text, is_static in parts:
+            if not text:
+                continue
+            if is_static:
+                tokens.extend(self._encode_static(text))
+            else:
+                tokens.extend(self._encode(text))
+        tokens.extend(self._chat_tail)
+        return tokens
+
+    def _to_tokens(self, prompt) -> list:
+        formatted = self._format_prompt(prompt)
+        if isinstance(formatted, str):
+            return self._encode(formatted)
+        return list(formatted)
+
+    def _format_prompt(self, prompt):
+        """토큰 ID 리스트는 그대로, 문자열은 chat template을 적용해 반환합니다."""
+        if not isinstance(prompt, str):
+            return prompt
+
+        messages = [{"role": "user", "content": prompt}]
+        return self.tokenizer.apply_chat_template(
+            messages, tokenize=False, add_generation_prompt=True
+        )
 
     def generate_text_stream(
-        self, prompt: str, max_tokens: int = 200, temperature: float = 0.7
+        self,
+        prompt: str | list,
+        max_tokens: int = 200,
+        temperature: float = 0.7,
+        adapter: str | None = None,
+        speculative: str | None = None,
     ):
         """
         텍스트 생성 결과를 실시간으로 yield 하는 제너레이터 함수
+        prompt는 문자열 또는 encode_prompt_parts()로 만든 토큰 ID 리스트
+        adapter를 지정하지 않으면 default_adapter를 사용합니다.
+        speculative를 지정하지 않으면 SPECULATIVE_MODE 설정을 따릅니다.
         """
         if not self.model:
             raise RuntimeError("Model is not loaded!")
 
-        messages = [{"role": "user", "content": prompt}]
-        prompt_formatted = self.tokenizer.apply_chat_template(
-            messages, tokenize=False, add_generation_prompt=True
-        )
+        mode = _check_speculative_mode(speculative or self.speculative_mode)
+        if mode == "draft" and self.draft_model is None:
+            mode = "off"
+        prompt_tokens = self._to_tokens(prompt)
+        # mlx_lm의 draft 디코딩은 윈도우가 돈 RotatingKVCache도 그대로 trim 하므로,
+        # 생성이 sliding window를 넘을 수 있으면 일반 디코딩으로 처리
+        longest = len(prompt_tokens) + max_tokens + NUM_DRAFT_TOKENS
+        if mode == "draft" and self._cache_window and longest >= self._cache_window:
+            mode = "off"
+        sampler = make_sampler(temp=temperature)
+        stats = self.spec_stats.setdefault(mode, _new_spec_stats())
 
-        # stream_generate 함수 사용
-        # 이 함수는 (token, text) 튜플을 yield 합니다.
-        stream = stream_generate(
-            self.model,
-            self.tokenizer,
-            prompt=prompt_formatted,
-            max_tokens=max_tokens,
-            sampler=make_sampler(temp=temperature),
-        )
+        # 모든 모드는 (token, from_draft) 튜플을 yield 합니다.
+        if mode == "prompt_lookup":
+            steps = prompt_lookup_generate_step(
+                prompt_tokens,
+                self.model,
+                sampler,
+                max_tokens=max_tokens,
+                num_draft_tokens=NUM_DRAFT_TOKENS,
+                stats=stats,
+            )
+        elif mode == "draft":
+            steps = count_draft_passes(
+                speculative_generate_step(
+                    mx.array(prompt_tokens),
+                    self.model,
+                    self.draft_model,
+                    num_draft_tokens=NUM_DRAFT_TOKENS,
+                    max_tokens=max_tokens,
+                    sampler=sampler,
+                ),
+                max_tokens,
+                NUM_DRAFT_TOKENS,
+                stats,
+            )
+        else:
+            steps = (
+                (token, False)
+                for token, _ in generate_step(
+                    mx.array(prompt_tokens),
+                    self.model,
+                    max_tokens=max_tokens,
+                    sampler=sampler,
+                )
+            )
+
+        # 토크나이저의 detokenizer는 공유 객체이므로 스트림마다 복사해서 사용
+        detokenizer = copy.copy(self.tokenizer.detokenizer)
+        detokenizer.reset()
+        eos_token_ids = self.tokenizer.eos_token_ids
+
+        # 스텝마다 락을 잡고 어댑터를 맞춘 뒤 한 토큰씩 생성합니다.
+        # 락을 yield 사이에 놓아주므로 다른 어댑터의 요청과 교대로 진행됩니다.
+        first_step = True
+        while True:
+            with self._lock:
+                self._activate(adapter)
+                started = time.perf_counter()
+                step = next(steps, None)
+                elapsed = time.perf_counter() - started
+            if step is None:
+                break
+
+            token, from_draft = step
+            # 첫 스텝은 프롬프트 prefill 시간이므로 디코딩 시간에서 제외
+            if first_step:
+                first_step = False
+            else:
+                stats["decode_seconds"] += elapsed
+                stats["decode_tokens"] += 1
+            stats["generated_tokens"] += 1
+            if from_draft:
+                stats["from_draft_tokens"] += 1
 
-        for response in stream:
-            # response.text에 새로 생성된 텍스트 조각이 들어있습니다.
-            # 이것을 바로바로 yield 하여 호출자에게 전달합니다.
-            yield response.text
+            if token in eos_token_ids:
+                break
+
+            # 새로 생성된 텍스트 조각을 바로바로 yield 하여 호출자에게 전달합니다.
+            detokenizer.add_token(token)
+            if detokenizer.last_segment:
+                yield detokenizer.last_segment
+
+        detokenizer.finalize()
+        if detokenizer.last_segment:
+            yield detokenizer.last_segment
+
+    def speculative_metrics(self) -> dict:
+        """
+        모드별 스펙큘레이티브 디코딩 지표를 반환합니다.
+        - acceptance_rate: 검증을 통과한 드래프트 토큰 비율
+        - tokens_per_pass: 타겟 forward 1회당 생성 토큰 수 (이론적 속도 향상)
+        - speedup: 일반 디코딩("off") 대비 실측 tokens/sec 비율
+        """
+        metrics = {}
+        for mode, stats in self.spec_stats.items():
+            # 일반 디코딩은 토큰마다 타겟 forward 1회
+            target_passes = stats["target_passes"] or stats["generated_tokens"]
+            drafted = stats["drafted_tokens"]
+
+            tokens_per_sec = (
+                stats["decode_tokens"] / stats["decode_seconds"]
+                if stats["decode_seconds"]
+                else 0.0
+            )
+            metrics[mode] = {
+                **stats,
+                "acceptance_rate": (
+                    stats["from_draft_tokens"] / drafted if drafted else 0.0
+                ),
+                "tokens_per_pass": (
+                    stats["generated_tokens"] / target_passes if target_passes else 1.0
+                ),
+                "tokens_per_sec": tokens_per_sec,
+            }
+
+        baseline = metrics.get("off", {}).get("tokens_per_sec")
+        for values in metrics.values():
+            values["speedup"] = (
+                values["tokens_per_sec"] / baseline if baseline else None
+            )
+
+        return {"mode": self.speculative_mode, "metrics": metrics}
 
     def generate_text(
-        self, prompt: str, max_tokens: int = 100, temperature: float = 0.0
+        self,
+        prompt: str | list,
+        max_tokens: int = 100,
+        temperature: float = 0.0,
+        adapter: str | None = None,
     ) -> str:
         """
         스트리밍 없이 한 번에 텍스트를 생성하여 반환합니다.
@@ -68,23 +443,62 @@ class LLMEngine:
         # Chat Template을 적용해야 모델이 더 잘 알아듣습니다.
         # (단, 입력 prompt가 이미 포맷팅된 상태라면 이 과정은 생략 가능합니다.
         #  여기서는 안전하게 'user' 메시지로 감싸서 처리합니다.)
-        messages = [{"role": "user", "content": prompt}]
-        prompt_formatted = self.tokenizer.apply_chat_template(
-            messages, tokenize=False, add_generation_prompt=True
-        )
+        # 토큰 ID 리스트는 이미 chat template이 적용된 상태이므로 그대로 사용합니다.
+        prompt_formatted = self._format_prompt(prompt)
 
-        response = generate(
-            self.model,
-            self.tokenizer,
-            prompt=prompt_formatted,
-            max_tokens=max_tokens,
-            sampler=make_sampler(
-                temp=temperature
-            ),  # 분류 작업은 창의성이 필요 없으므로 temp=0.0 권장
-            verbose=False,  # 로그 지저분해지지 않게 끔
-        )
+        with self._lock:
+            self._activate(adapter)
+            response = generate(
+                self.model,
+                self.tokenizer,
+                prompt=prompt_formatted,
+                max_tokens=max_tokens,
+                sampler=make_sampler(
+                    temp=temperature
+                ),  # 분류 작업은 창의성이 필요 없으므로 temp=0.0 권장
+                verbose=False,  # 로그 지저분해지지 않게 끔
+            )
 
         return response
 
+    def generate_batch(
+        self,
+        prompts: list,
+        adapters: list | None = None,
+        max_tokens: int = 200,
+        temperature: float = 0.0,
+    ) -> list:
+        """
+        여러 프롬프트를 한 번에 생성합니다 (오프라인/평가용).
+        어댑터별로 묶어서 어댑터당 한 번만 가중치를 교체하고 batch_generate로
+        처리합니다.
+        반환값은 입력 순서와 같은 텍스트 리스트입니다.
+        """
+        if not self.model:
+            raise RuntimeError("Model is not loaded!")
+
+        adapters = adapters or [None] * len(prompts)
+        groups = {}
+        for index, adapter in enumerate(adapters):
+            groups.setdefault(adapter or self.default_adapter, []).append(index)
+
+        texts = [""] * len(prompts)
+        for adapter, indices in groups.items():
+            tokens = [self._to_tokens(prompts[i]) for i in indices]
+            with self._lock:
+                self._activate(adapter)
+                response = batch_generate(
+                    self.model,
+                    self.tokenizer,
+                    tokens,
+                    max_tokens=max_tokens,
+                    sampler=make_sampler(temp=temperature),
+                    verbose=False,
+                )
+            for i, text in zip(indices, response.texts):
+                texts[i] = text
+
+        return texts
+
 
 engine = LLMEngine()
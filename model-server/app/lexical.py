@@ -0,0 +1,130 @@
+import json
+import math
+import re
+from collections import Counter
+from difflib import get_close_matches
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# 메뉴 이름 매칭에서 무시할 단어 (예: "The Gemma Classic" == "Gemma Classic")
+STOPWORDS = {"a", "an", "and", "the", "of", "with", "please", "i", "to"}
+
+
+def tokenize(text: str) -> list:
+    """소문자화 + 단어 분리 + 간단한 복수형 제거 (stacks -> stack)"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _matches_filter(metadata: dict, filter: dict | None) -> bool:
+    if not filter:
+        return True
+    return all(metadata.get(key) == value for key, value in filter.items())
+
+
+class LexicalIndex:
+    """
+    인제스트된 문서에 대한 BM25 역색인.
+    scripts/ingest.py가 JSON으로 저장하고 RagEngine이 메모리에 로드합니다.
+    """
+
+    def __init__(self, docs: list, postings: dict, k1: float = 1.5, b: float = 0.75):
+        self.docs = docs  # [{"content": ..., "metadata": {...}, "length": n}]
+        self.postings = postings  # term -> [[doc_id, tf], ...]
+        self.k1 = k1
+        self.b = b
+
+        total_length = sum(doc["length"] for doc in docs)
+        self.avg_length = total_length / len(docs) if docs else 0.0
+        self.idf = {
+            term: math.log(1 + (len(docs) - len(hits) + 0.5) / (len(hits) + 0.5))
+            for term, hits in postings.items()
+        }
+
+        # 메뉴 이름 -> 이름 토큰 (정확/유사 이름 매칭용)
+        self.names = {}
+        for doc_id, doc in enumerate(docs):
+            name = doc["metadata"].get("name")
+            if name:
+                name_tokens = [t for t in tokenize(name) if t not in STOPWORDS]
+                self.names[doc_id] = name_tokens
+
+    @classmethod
+    def build(cls, documents: list, **kwargs):
+        """(page_content, metadata) 리스트로부터 역색인을 생성합니다."""
+        docs = []
+        postings = {}
+        for doc_id, (content, metadata) in enumerate(documents):
+            # 이름은 본문에도 있지만 가중치를 주기 위해 한 번 더 색인
+            terms = tokenize(content) + tokenize(metadata.get("name", ""))
+            docs.append(
+                {"content": content, "metadata": metadata, "length": len(terms)}
+            )
+            for term, tf in Counter(terms).items():
+                postings.setdefault(term, []).append([doc_id, tf])
+
+        return cls(docs, postings, **kwargs)
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "k1": self.k1,
+                    "b": self.b,
+                    "docs": self.docs,
+                    "postings": self.postings,
+                },
+                f,
+                ensure_ascii=False,
+            )
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["docs"], data["postings"], k1=data["k1"], b=data["b"])
+
+    def search(self, query: str, k: int = 3, filter: dict | None = None) -> list:
+        """BM25 점수 상위 k개의 doc_id를 점수 내림차순으로 반환합니다."""
+        scores = Counter()
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                length = self.docs[doc_id]["length"]
+                norm = self.k1 * (1 - self.b + self.b * length / self.avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = [
+            doc_id
+            for doc_id, _ in scores.most_common()
+            if _matches_filter(self.docs[doc_id]["metadata"], filter)
+        ]
+        return ranked[:k]
+
+    def match_names(self, query: str, filter: dict | None = None) -> list:
+        """
+        질문에 이름이 (오타 허용) 그대로 들어있는 문서의 doc_id를 반환합니다.
+        이름의 모든 단어가 질문에 있어야 매칭으로 봅니다.
+        """
+        query_tokens = tokenize(query)
+        matches = []
+        for doc_id, name_tokens in self.names.items():
+            if not name_tokens:
+                continue
+            if not _matches_filter(self.docs[doc_id]["metadata"], filter):
+                continue
+            if all(
+                token in query_tokens
+                or get_close_matches(token, query_tokens, n=1, cutoff=0.8)
+                for token in name_tokens
+            ):
+                matches.append(doc_id)
+        return matches
+
+    def content(self, doc_id: int) -> str:
+        return self.docs[doc_id]["content"]
@@ -1,13 +1,18 @@
 import os
 import traceback
+from collections import Counter
+from typing import List
 
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 
 from app.agent import agent_app
-from app.agent.state import Intent
+from app.agent.state import ROLE_ASSISTANT, Intent, make_input_state, make_message
+from app.batch import BatchError, run_batch
 from app.engine import engine
+from app.memory import MEMORY_DEBUG, MemoryProfiler
+from app.rag import rag_engine
 
 
 def validate_required_environment_variables():
@@ -24,43 +29,92 @@ validate_required_environment_variables()
 
 app = FastAPI(title="Gemma Agent Server")
 
+# /chat/batch 요청당 최대 생성 토큰 수와 대화 수
+MAX_BATCH_TOKENS = int(os.getenv("MAX_BATCH_TOKENS", "1000"))
+MAX_BATCH_CONVERSATIONS = int(os.getenv("MAX_BATCH_CONVERSATIONS", "64"))
+
+# 🟢 Static fast-path로 생략된 LLM 호출 수 (의도별)
+model_calls_avoided: Counter = Counter()
+
+# 🧪 MEMORY_DEBUG=true일 때만 메모리 프로파일러 실행
+memory_profiler = MemoryProfiler(agent_app.checkpointer, engine, rag_engine)
+if MEMORY_DEBUG:
+    memory_profiler.start()
+
 
 class ChatRequest(BaseModel):
     message: str
     session_id: str = "default_guest"
+    # 응답 생성에 사용할 LoRA 어댑터 (None이면 엔진 기본값)
+    adapter: str | None = None
+
+
+class BatchConversation(BaseModel):
+    id: str | None = None
+    messages: List[str]
+
+
+class BatchChatRequest(BaseModel):
+    conversations: List[BatchConversation] = Field(
+        ..., min_length=1, max_length=MAX_BATCH_CONVERSATIONS
+    )
+    adapter: str | None = None
+    # 배치 생성 중에는 엔진 락을 잡으므로 인터랙티브 /chat이 밀리지 않도록 상한을 둠
+    max_tokens: int = Field(500, ge=1, le=MAX_BATCH_TOKENS)
+
+
+class AdapterRequest(BaseModel):
+    name: str
+    path: str
 
 
 @app.post("/chat")
 def chat_endpoint(req: ChatRequest):
+    if not engine.has_adapter(req.adapter):
+        raise HTTPException(status_code=404, detail=f"Unknown adapter: {req.adapter}")
+
     try:
         print(f"📩 User Query: {req.message} (Session: {req.session_id})")
 
         config = {"configurable": {"thread_id": req.session_id}}
 
-        input_state = {
-            "messages": [{"role": "user", "content": req.message}],
-            "cart": [],
-            "current_intent": Intent.GREETING.value,
-            "final_response": "",
-        }
+        input_state = make_input_state(req.message)
 
         result = agent_app.invoke(input_state, config=config)
         final_prompt = result["final_response"]
+        is_static = result.get("static_response", False)
+        prompt_parts = result.get("prompt_parts")
 
         dynamic_temperature = result.get("temperature", 0.7)
 
         history_count = len(result["messages"])
         print(f"🧠 Memory Depth: {history_count} messages")
 
+        if is_static:
+            intent = result.get("current_intent", Intent.GREETING.value)
+            model_calls_avoided[intent] += 1
+            print(f"⚡ [Fast-path] {intent}: LLM call skipped")
+
         async def response_generator():
             full_response = ""
 
             try:
-                stream = engine.generate_text_stream(
-                    prompt=final_prompt,
-                    max_tokens=500,
-                    temperature=dynamic_temperature,
-                )
+                # 핸들러가 완성된 응답을 준 경우 모델을 거치지 않고 그대로 전송
+                if is_static:
+                    stream = [final_prompt]
+                else:
+                    # 프롬프트 조각이 있으면 정적 조각의 캐시된 토큰을 재사용
+                    prompt = (
+                        engine.encode_prompt_parts(prompt_parts)
+                        if prompt_parts
+                        else final_prompt
+                    )
+                    stream = engine.generate_text_stream(
+                        prompt=prompt,
+                        max_tokens=500,
+                        temperature=dynamic_temperature,
+                        adapter=req.adapter,
+                    )
 
                 for token in stream:
                     full_response += token
@@ -70,7 +124,7 @@ def chat_endpoint(req: ChatRequest):
 
                 agent_app.update_state(
                     config,
-                    {"messages": [{"role": "assistant", "content": full_response}]},
+                    {"messages": [make_message(ROLE_ASSISTANT, full_response)]},
                 )
 
             except Exception as stream_error:
@@ -97,6 +151,85 @@ def chat_endpoint(req: ChatRequest):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+@app.post("/chat/batch")
+def chat_batch_endpoint(req: BatchChatRequest):
+    """
+    여러 대화 스크립트를 격리된 세션에서 한 번에 실행하고 전체 대화 기록을 반환합니다.
+    (오프라인 리플레이/평가용, 스트리밍 없음)
+    """
+    if not engine.has_adapter(req.adapter):
+        raise HTTPException(status_code=404, detail=f"Unknown adapter: {req.adapter}")
+
+    try:
+        transcripts, stats = run_batch(
+            [conv.model_dump() for conv in req.conversations],
+            adapter=req.adapter,
+            max_tokens=req.max_tokens,
+        )
+    except BatchError as e:
+        # 완료된 턴까지의 기록은 함께 반환 (모델 오류는 503, 그 외는 500)
+        model_calls_avoided.update(e.stats["model_calls_avoided"])
+        is_model_error = isinstance(e.__cause__, RuntimeError)
+        label = "Model service error" if is_model_error else "Internal server error"
+        return JSONResponse(
+            {
+                "detail": f"{label}: {str(e)}",
+                "conversations": e.transcripts,
+                "stats": e.stats,
+            },
+            status_code=503 if is_model_error else 500,
+        )
+
+    model_calls_avoided.update(stats["model_calls_avoided"])
+    print(
+        f"📦 Batch finished: {stats['turns']} turns, "
+        f"{stats['tokens_per_sec']:.1f} tokens/sec"
+    )
+    return {"conversations": transcripts, "stats": stats}
+
+
+@app.get("/stats/fast-path")
+def fast_path_stats():
+    """Static fast-path로 생략된 LLM 호출 수를 의도별로 반환"""
+    return {
+        "model_calls_avoided": dict(model_calls_avoided),
+        "total": sum(model_calls_avoided.values()),
+    }
+
+
+@app.get("/stats/speculative")
+def speculative_stats():
+    """스펙큘레이티브 디코딩 수락률 및 속도 향상 지표 반환"""
+    return engine.speculative_metrics()
+
+
+@app.get("/debug/memory")
+def debug_memory(heap: bool = True):
+    """서브시스템별 메모리 사용량 (MEMORY_DEBUG=true에서만 활성화)"""
+    if not MEMORY_DEBUG:
+        raise HTTPException(status_code=404, detail="Memory debugging is disabled")
+    return memory_profiler.report(include_heap=heap)
+
+
+@app.get("/adapters")
+def list_adapters():
+    """등록된 LoRA 어댑터 목록과 기본/활성 어댑터 반환"""
+    return engine.list_adapters()
+
+
+@app.post("/adapters")
+def register_adapter(req: AdapterRequest):
+    """어댑터 등록 또는 핫 리로드 (베이스 가중치 재로드 없음)"""
+    try:
+        engine.register_adapter(req.name, req.path)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return engine.list_adapters()
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,250 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# MEMORY_DEBUG=true일 때만 /debug/memory와 주기 로거를 켭니다.
+MEMORY_DEBUG = os.getenv("MEMORY_DEBUG", "false").lower() == "true"
+# tracemalloc은 샘플링이 아니라 모든 할당을 추적하므로(CPU/메모리 오버헤드 큼)
+# 누수 조사 시에만 별도로 켭니다. 나머지 카운터는 MEMORY_DEBUG만으로 동작합니다.
+MEMORY_HEAP_TRACE = os.getenv("MEMORY_HEAP_TRACE", "false").lower() == "true"
+# 주기 로그 간격 (초)
+MEMORY_LOG_INTERVAL = int(os.getenv("MEMORY_LOG_INTERVAL", "300"))
+# tracemalloc이 저장할 스택 프레임 수 (1이면 오버헤드가 가장 작음)
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "1"))
+MEMORY_TOP_N = int(os.getenv("MEMORY_TOP_N", "10"))
+
+
+def _payload_bytes(value) -> int:
+    """직렬화된 체크포인트 값((type, bytes) 튜플 등)의 바이트 수"""
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(_payload_bytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(_payload_bytes(v) for v in value.values())
+    return sys.getsizeof(value)
+
+
+def _rss_bytes() -> int | None:
+    """현재 RSS (Linux는 /proc, 그 외는 최대 RSS로 대체)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS는 bytes, Linux는 KB 단위
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+class MemoryProfiler:
+    """
+    장시간 실행되는 서버의 서브시스템별 메모리 사용량을 집계합니다.
+    - checkpointer: 세션 수, 체크포인트 수, 직렬화된 체크포인트/채널 값 바이트
+    - engine: MLX 메모리, 토큰 캐시, 어댑터 가중치
+    - rag: 임베딩 모델 파라미터, BM25 역색인
+    - heap: tracemalloc 상위 할당 위치와 직전 스냅샷 대비 증가분 (MEMORY_HEAP_TRACE)
+    """
+
+    def __init__(self, checkpointer, engine, rag_engine):
+        self.checkpointer = checkpointer
+        self.engine = engine
+        self.rag_engine = rag_engine
+        # 주기 로거와 /debug/memory가 서로의 비교 기준을 바꾸지 않도록 따로 보관
+        self._previous_snapshots = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, heap_trace: bool = MEMORY_HEAP_TRACE):
+        if heap_trace and not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACE_FRAMES)
+            print("🧪 Heap tracing enabled (tracemalloc traces every allocation)")
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        print(f"🧪 Memory profiler started (every {MEMORY_LOG_INTERVAL}s)")
+
+    def _run(self):
+        while True:
+            time.sleep(MEMORY_LOG_INTERVAL)
+            try:
+                self.log()
+            except Exception as e:
+                print(f"⚠️ Memory report failed: {e}")
+
+    def log(self):
+        report = self.report(baseline="logger")
+        checkpoint = report["checkpointer"]
+        engine = report["engine"]
+        heap = report["heap"]
+        print(
+            f"🧪 [Memory] rss={_mb(report['rss_bytes'])} "
+            f"sessions={checkpoint['sessions']} "
+            f"checkpoints={_mb(checkpoint['bytes'])} "
+            f"mlx_active={_mb(engine.get('mlx_active_bytes'))} "
+            f"heap={_mb(heap.get('traced_bytes'))}"
+        )
+        for entry in heap.get("growth", [])[:3]:
+            print(f"   ↗ {entry['location']}: {entry['size_diff_bytes']:+d} bytes")
+
+    def report(self, include_heap: bool = True, baseline: str = "request") -> dict:
+        return {
+            "rss_bytes": _rss_bytes(),
+            "checkpointer": self.checkpointer_usage(),
+            "engine": self.engine_usage(),
+            "rag": self.rag_usage(),
+            "heap": self.heap_usage(baseline) if include_heap else {},
+        }
+
+    def checkpointer_usage(self) -> dict:
+        """
+        MemorySaver 사용량을 세션(thread_id)별로 집계합니다.
+        - storage: thread_id -> ns -> checkpoint_id -> 체크포인트
+        - blobs: (thread_id, ns, channel, version) -> 채널 값 (messages, cart 등)
+        - writes: (thread_id, ns, checkpoint_id) -> 대기 중인 쓰기
+        """
+        storage = getattr(self.checkpointer, "storage", {})
+        blobs = getattr(self.checkpointer, "blobs", {})
+        writes = getattr(self.checkpointer, "writes", {})
+
+        # 요청 처리 중에 변경될 수 있으므로 복사본을 순회
+        checkpoints = 0
+        checkpoint_bytes = {}
+        for thread_id, namespaces in list(storage.items()):
+            size = 0
+            for checkpoints_by_id in list(namespaces.values()):
+                checkpoints += len(checkpoints_by_id)
+                size += _payload_bytes(list(checkpoints_by_id.values()))
+            checkpoint_bytes[thread_id] = size
+
+        blob_bytes = {}
+        for (thread_id, *_), value in list(blobs.items()):
+            blob_bytes[thread_id] = blob_bytes.get(thread_id, 0) + _payload_bytes(value)
+
+        write_bytes = sum(
+            _payload_bytes(list(pending.values())) for pending in list(writes.values())
+        )
+
+        session_bytes = {
+            thread_id: checkpoint_bytes.get(thread_id, 0) + blob_bytes.get(thread_id, 0)
+            for thread_id in checkpoint_bytes.keys() | blob_bytes.keys()
+        }
+        largest = max(
+            session_bytes.items(), key=lambda item: item[1], default=(None, 0)
+        )
+        return {
+            "sessions": len(session_bytes),
+            "checkpoints": checkpoints,
+            "bytes": sum(session_bytes.values()),
+            "checkpoint_bytes": sum(checkpoint_bytes.values()),
+            "blob_bytes": sum(blob_bytes.values()),
+            "pending_write_bytes": write_bytes,
+            "largest_session": {"session_id": largest[0], "bytes": largest[1]},
+        }
+
+    def engine_usage(self) -> dict:
+        import mlx.core as mx
+
+        usage = {}
+        # mlx 버전에 따라 mx.* 또는 mx.metal.* 에 있음
+        for name in ("active", "cache", "peak"):
+            getter = getattr(mx, f"get_{name}_memory", None) or getattr(
+                mx.metal, f"get_{name}_memory", None
+            )
+            usage[f"mlx_{name}_bytes"] = getter() if getter else None
+
+        encode_static = getattr(self.engine, "_encode_static", None)
+        if encode_static is not None:
+            info = encode_static.cache_info()
+            usage["static_token_cache"] = {
+                "entries": info.currsize,
+                "max_entries": info.maxsize,
+                "hits": info.hits,
+                "misses": info.misses,
+            }
+
+        adapters = getattr(self.engine, "adapters", {})
+        usage["adapters"] = {
+            name: sum(array.nbytes for array in weights.values())
+            for name, weights in adapters.items()
+        }
+        return usage
+
+    def rag_usage(self) -> dict:
+        usage = {}
+        client = getattr(getattr(self.rag_engine, "embeddings", None), "_client", None)
+        if client is not None and hasattr(client, "parameters"):
+            usage["embedding_model_bytes"] = sum(
+                p.numel() * p.element_size() for p in client.parameters()
+            )
+
+        lexical_index = getattr(self.rag_engine, "lexical_index", None)
+        if lexical_index is not None:
+            usage["lexical_index"] = {
+                "docs": len(lexical_index.docs),
+                "terms": len(lexical_index.postings),
+            }
+        return usage
+
+    def heap_usage(self, baseline: str = "request") -> dict:
+        """
+        tracemalloc 스냅샷의 상위 할당 위치와 직전 스냅샷 대비 증가분.
+        baseline(logger/request)별로 직전 스냅샷을 따로 둡니다.
+        """
+        if not tracemalloc.is_tracing():
+            return {"tracing": False}
+
+        with self._lock:
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                (
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                )
+            )
+            previous = self._previous_snapshots.get(baseline)
+            self._previous_snapshots[baseline] = snapshot
+
+        traced_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        top = [
+            {
+                "location": str(stat.traceback),
+                "size_bytes": stat.size,
+                "count": stat.count,
+            }
+            for stat in snapshot.statistics("lineno")[:MEMORY_TOP_N]
+        ]
+
+        growth = []
+        if previous is not None:
+            growth = [
+                {
+                    "location": str(stat.traceback),
+                    "size_diff_bytes": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in snapshot.compare_to(previous, "lineno")[:MEMORY_TOP_N]
+                if stat.size_diff > 0
+            ]
+
+        return {
+            "tracing": True,
+            "traced_bytes": traced_bytes,
+            "peak_bytes": peak_bytes,
+            "top": top,
+            "growth": growth,
+        }
+
+
+def _mb(value) -> str:
+    return "n/a" if value is None else f"{value / 1024 / 1024:.1f}MB"
@@ -4,9 +4,19 @@ from dotenv import load_dotenv
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_pinecone import PineconeVectorStore
 
+from app.lexical import LexicalIndex
+
 # 환경변수 로드
 load_dotenv()
 
+# scripts/ingest.py가 생성하는 BM25 역색인 파일
+LEXICAL_INDEX_PATH = os.getenv(
+    "LEXICAL_INDEX_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "lexical_index.json"),
+)
+# Reciprocal Rank Fusion 상수 (클수록 하위 순위 문서의 영향이 커짐)
+RRF_K = 60
+
 
 class RagEngine:
     def __init__(self):
@@ -26,14 +36,59 @@ class RagEngine:
         self.vector_store = PineconeVectorStore(
             index_name=self.index_name, embedding=self.embeddings
         )
+
+        # 4. BM25 역색인 로드 (없으면 벡터 검색만 사용)
+        self.lexical_index = None
+        if os.path.exists(LEXICAL_INDEX_PATH):
+            self.lexical_index = LexicalIndex.load(LEXICAL_INDEX_PATH)
+            print(f"📚 Lexical index loaded ({len(self.lexical_index.docs)} docs)")
+        else:
+            print("⚠️ Lexical index not found. Run scripts/ingest.py to build it.")
+
         print(f"✅ RAG Engine Ready (Index: {self.index_name})")
 
-    def search(self, query: str, k: int = 3, filter: dict = None):
+    def search(
+        self, query: str, k: int = 3, filter: dict = None, name_match_k: int = None
+    ):
         """
         질문(query)과 관련된 문서 k개를 찾아서 반환
         filter 옵션을 통해 메타데이터 필터링 지원 (예: {"type": "menu"})
+
+        1. 메뉴 이름이 질문에 그대로 있으면 임베딩 없이 BM25만으로 응답
+           (이름이 매칭된 문서는 모두 포함하고, 나머지는 name_match_k개까지 채움)
+        2. 그 외에는 BM25와 벡터 검색 결과를 RRF로 합쳐서 k개 반환
+        역색인이 없으면 벡터 검색만 사용
         """
         print(f"🔍 [RAG] Searching for: '{query}' (Filter: {filter})")
+
+        if self.lexical_index is None:
+            return self._vector_search(query, k, filter)
+
+        index = self.lexical_index
+        name_hits = index.match_names(query, filter)
+        lexical_hits = index.search(query, k=k, filter=filter)
+
+        if name_hits:
+            # 이름 매칭 문서는 모두 앞에 두고, name_match_k까지 BM25 순위로 채움
+            limit = name_match_k or k
+            filler = [i for i in lexical_hits if i not in name_hits]
+            ranked = name_hits + filler[: max(limit - len(name_hits), 0)]
+            print(f"⚡ [RAG] Exact name match, skipping embedding ({len(name_hits)})")
+            return [index.content(i) for i in ranked]
+
+        vector_hits = self._vector_search(query, k, filter)
+
+        # Reciprocal Rank Fusion: 점수 스케일이 다른 두 검색 결과를 순위로 합산
+        scores = {}
+        for rank, doc_id in enumerate(lexical_hits):
+            content = index.content(doc_id)
+            scores[content] = scores.get(content, 0.0) + 1 / (RRF_K + rank + 1)
+        for rank, content in enumerate(vector_hits):
+            scores[content] = scores.get(content, 0.0) + 1 / (RRF_K + rank + 1)
+
+        return sorted(scores, key=scores.get, reverse=True)[:k]
+
+    def _vector_search(self, query: str, k: int, filter: dict = None):
         # similarity_search: 가장 유사한 문서 검색
         docs = self.vector_store.similarity_search(query, k=k, filter=filter)
         # 텍스트 내용만 리스트로 반환
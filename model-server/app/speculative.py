@@ -0,0 +1,132 @@
+import mlx.core as mx
+from mlx_lm.models.cache import (
+    can_trim_prompt_cache,
+    make_prompt_cache,
+    trim_prompt_cache,
+)
+
+
+def find_draft(tokens: list, ngram_size: int = 3, num_draft_tokens: int = 4) -> list:
+    """
+    Prompt lookup: 마지막 n-gram이 앞(프롬프트 + 생성 결과)에 다시 나타나면
+    그 뒤에 이어졌던 토큰들을 드래프트로 반환합니다.
+    메뉴 이름/가격처럼 컨텍스트를 그대로 옮겨 쓰는 응답에서 적중률이 높습니다.
+    """
+    for n in range(ngram_size, 1, -1):
+        if len(tokens) <= n:
+            continue
+        tail = tokens[-n:]
+        # 가장 최근 위치부터 역순으로 탐색 (마지막 n-gram 자신은 제외)
+        for start in range(len(tokens) - n - 1, -1, -1):
+            if tokens[start : start + n] == tail:
+                draft = tokens[start + n : start + n + num_draft_tokens]
+                if draft:
+                    return draft
+    return []
+
+
+def cache_window(cache: list) -> int | None:
+    """슬라이딩 윈도우 캐시 레이어 중 가장 작은 윈도우 크기 (없으면 None)"""
+    sizes = [layer.max_size for layer in cache if getattr(layer, "max_size", None)]
+    return min(sizes) if sizes else None
+
+
+def draft_budget(cache: list, num_draft_tokens: int) -> int:
+    """
+    검증 forward 후에도 되돌릴 수 있는 드래프트 길이를 반환합니다.
+    슬라이딩 윈도우 캐시(RotatingKVCache)는 forward 도중 윈도우가 한 바퀴 돌면
+    이후 trim이 엉뚱한 위치를 지우므로, 윈도우에 남은 자리만큼만 드래프트합니다.
+    """
+    if not can_trim_prompt_cache(cache):
+        return 0
+
+    budget = num_draft_tokens
+    for layer in cache:
+        if getattr(layer, "max_size", None):
+            # 검증 입력은 y + 드래프트이고, forward 후에도 offset < max_size여야 함
+            budget = min(budget, layer.max_size - layer.offset - 2)
+    return max(budget, 0)
+
+
+def count_draft_passes(steps, max_tokens: int, num_draft_tokens: int, stats: dict):
+    """
+    mlx_lm speculative_generate_step의 (token, logprobs, from_draft)를
+    (token, from_draft)로 바꾸면서 검증 패스 수와 드래프트 토큰 수를 셉니다.
+    패스마다 수락된 드래프트 토큰(from_draft=True) 뒤에 타겟 토큰 하나가 오고,
+    드래프트 길이는 min(남은 토큰 수, num_draft_tokens)입니다.
+    """
+    generated = 0
+    in_pass = False
+    for token, _, from_draft in steps:
+        if not in_pass:
+            in_pass = True
+            stats["target_passes"] = stats.get("target_passes", 0) + 1
+            stats["drafted_tokens"] = stats.get("drafted_tokens", 0) + min(
+                max_tokens - generated, num_draft_tokens
+            )
+        if not from_draft:
+            in_pass = False
+        generated += 1
+        yield token, from_draft
+
+
+def prompt_lookup_generate_step(
+    prompt: list,
+    model,
+    sampler,
+    max_tokens: int = 200,
+    num_draft_tokens: int = 4,
+    ngram_size: int = 3,
+    stats: dict | None = None,
+):
+    """
+    n-gram 드래프트를 타겟 모델 한 번의 forward로 검증하는 생성 스텝.
+    (token, from_draft) 튜플을 yield 합니다.
+    드래프트가 결정적이므로 "샘플링 후 일치 여부 비교"만으로 타겟 분포와
+    동일한 결과를 얻습니다.
+    """
+    stats = stats if stats is not None else {}
+    cache = make_prompt_cache(model)
+    tokens = list(prompt)
+
+    def _forward(inputs, num_outputs):
+        logits = model(mx.array(inputs)[None], cache=cache)[0, -num_outputs:]
+        logprobs = logits - mx.logsumexp(logits, axis=-1, keepdims=True)
+        return sampler(logprobs).tolist()
+
+    y = _forward(tokens, 1)[0]
+
+    generated = 0
+    while generated < max_tokens:
+        tokens.append(y)
+        generated += 1
+        yield y, False
+        if generated >= max_tokens:
+            break
+
+        draft = []
+        # 슬라이딩 윈도우 캐시에 자리가 없으면 되돌릴 수 없으므로 드래프트 중단
+        budget = min(draft_budget(cache, num_draft_tokens), max_tokens - generated)
+        if budget > 0:
+            draft = find_draft(tokens, ngram_size, budget)
+
+        verified = _forward([y] + draft, len(draft) + 1)
+        stats["target_passes"] = stats.get("target_passes", 0) + 1
+
+        accepted = 0
+        for drafted, target in zip(draft, verified):
+            if drafted != target:
+                break
+            accepted += 1
+
+        stats["drafted_tokens"] = stats.get("drafted_tokens", 0) + len(draft)
+        stats["accepted_tokens"] = stats.get("accepted_tokens", 0) + accepted
+
+        for token in draft[:accepted]:
+            tokens.append(token)
+            generated += 1
+            yield token, True
+
+        if len(draft) > accepted:
+            trim_prompt_cache(cache, len(draft) - accepted)
+        y = verified[accepted]
@@ -0,0 +1,124 @@
+import os
+import statistics
+import sys
+import time
+
+# 상위 디렉토리(app) 모듈 import 설정
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app.agent.graph import extract_cart_update  # noqa: E402
+from app.agent.router import (  # noqa: E402
+    CART_INTENTS,
+    classify_and_extract,
+    classify_intent,
+)
+from app.agent.state import (  # noqa: E402
+    ROLE_ASSISTANT,
+    ROLE_USER,
+    make_message,
+)
+from scripts.evaluate_router import percentile  # noqa: E402
+
+# (이전 AI 발화, 사용자 메시지, 기대 의도, 기대 카트 {이름: 수량})
+CASES = [
+    ("", "I'll take The Gemma Classic, please.", "ORDER", {"The Gemma Classic": 1}),
+    ("", "Two Gemma Double Stacks please", "ORDER", {"Gemma Double Stack": 2}),
+    (
+        "Would you like to try the Silicon Valley Vege for $9.50?",
+        "Yes, I'll take that",
+        "ORDER",
+        {"Silicon Valley Vege": 1},
+    ),
+    ("", "Add one Python Fries", "ORDER", {"Python Fries": 1}),
+    ("", "Remove one Gemma Classic", "REMOVE", {"The Gemma Classic": -1}),
+    ("", "Take out the fries", "REMOVE", {"Python Fries": -1}),
+    ("", "Hi there!", "GREETING", {}),
+    ("", "What's on the menu?", "MENU_QA", {}),
+    ("", "What time do you close?", "STORE_INFO", {}),
+    ("", "What did I order?", "HISTORY", {}),
+    ("", "My burger was cold!", "COMPLAINT", {}),
+    ("", "Cancel my order", "CANCEL", {}),
+]
+
+
+def make_state(prev_ai_msg, user_msg):
+    messages = []
+    if prev_ai_msg:
+        messages.append(make_message(ROLE_ASSISTANT, prev_ai_msg))
+    messages.append(make_message(ROLE_USER, user_msg))
+    return {"messages": messages, "cart": {}}
+
+
+def cart_matches(cart, expected):
+    actual = {}
+    for item in cart:
+        name = item.get("name")
+        if name:
+            actual[name] = actual.get(name, 0) + item.get("quantity", 0)
+    return actual == expected
+
+
+def run_current(state):
+    """기존 경로: classify_intent -> (ORDER/REMOVE면) extract_cart_update"""
+    intent = classify_intent(state)["current_intent"]
+    cart = []
+    if intent in CART_INTENTS:
+        cart = extract_cart_update(state)["cart"]
+    return intent, cart
+
+
+def run_fused(state):
+    """Fused 경로: classify_and_extract 한 번"""
+    result = classify_and_extract(state)
+    return result["current_intent"], result.get("cart", [])
+
+
+def benchmark(name, runner):
+    latencies = []
+    intent_hits = 0
+    cart_hits = 0
+    cart_total = 0
+
+    for prev_ai_msg, user_msg, expected_intent, expected_cart in CASES:
+        state = make_state(prev_ai_msg, user_msg)
+
+        start = time.perf_counter()
+        intent, cart = runner(state)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        intent_hits += intent == expected_intent
+        if expected_intent in CART_INTENTS:
+            cart_total += 1
+            cart_hits += cart_matches(cart, expected_cart)
+
+    return {
+        "name": name,
+        "intent_acc": intent_hits / len(CASES),
+        "cart_acc": cart_hits / cart_total if cart_total else 0.0,
+        "mean_ms": statistics.mean(latencies),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+    }
+
+
+def main():
+    print(f"🏁 Benchmarking routers on {len(CASES)} cases...")
+
+    # 워밍업 (모델 컴파일/캐시 영향 제거)
+    run_current(make_state("", "Hello"))
+    run_fused(make_state("", "Hello"))
+
+    results = [benchmark("current", run_current), benchmark("fused", run_fused)]
+
+    print(
+        f"\n{'path':<10}{'intent acc':>12}{'cart acc':>10}"
+        f"{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}"
+    )
+    for r in results:
+        print(
+            f"{r['name']:<10}{r['intent_acc']:>12.2%}{r['cart_acc']:>10.2%}"
+            f"{r['mean_ms']:>10.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import os
+import sys
+
+# 상위 디렉토리(app) 모듈 import 설정
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app.agent.handlers import handle_menu_qa, handle_order  # noqa: E402
+from app.agent.state import ROLE_USER, make_message  # noqa: E402
+from app.engine import engine  # noqa: E402
+
+QUERIES = [
+    (handle_menu_qa, "What burgers do you have?"),
+    (handle_menu_qa, "Show me the whole menu"),
+    (handle_order, "I'll take a Gemma Double Stack and Python Fries"),
+    (handle_order, "One Silicon Valley Vege please"),
+]
+
+
+def main():
+    modes = ["off", "prompt_lookup"]
+    if engine.draft_model is not None:
+        modes.append("draft")
+
+    for mode in modes:
+        print(f"🏁 Running {len(QUERIES)} prompts with speculative={mode}...")
+        for handler, query in QUERIES:
+            state = {"messages": [make_message(ROLE_USER, query)], "cart": {}}
+            result = handler(state)
+            prompt = engine.encode_prompt_parts(result["prompt_parts"])
+            # 모드 간 출력이 같아야 비교가 공정하므로 greedy 디코딩
+            "".join(
+                engine.generate_text_stream(
+                    prompt, max_tokens=300, temperature=0.0, speculative=mode
+                )
+            )
+
+    metrics = engine.speculative_metrics()["metrics"]
+    print(
+        f"\n{'mode':<15}{'tokens':>8}{'accept':>9}{'tok/pass':>10}"
+        f"{'tok/s':>9}{'speedup':>9}"
+    )
+    for mode, m in metrics.items():
+        speedup = f"{m['speedup']:.2f}x" if m["speedup"] else "-"
+        print(
+            f"{mode:<15}{m['generated_tokens']:>8}{m['acceptance_rate']:>9.2%}"
+            f"{m['tokens_per_pass']:>10.2f}{m['tokens_per_sec']:>9.1f}{speedup:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
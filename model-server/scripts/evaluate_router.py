@@ -0,0 +1,179 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+# 상위 디렉토리(app) 모듈 import 설정
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app.agent.state import (  # noqa: E402
+    ROLE_ASSISTANT,
+    ROLE_USER,
+    Intent,
+    make_message,
+    message_content,
+)
+
+DATASET_PATH = os.path.join(
+    os.path.dirname(__file__), "../../resources/intent_eval.jsonl"
+)
+INTENTS = [intent.value for intent in Intent]
+
+# 모델 호출 없는 하한 기준선 (키워드 -> 의도, 먼저 매칭되는 규칙 우선)
+KEYWORD_RULES = [
+    ("CANCEL", ("cancel", "clear all", "start over")),
+    ("REMOVE", ("remove", "take out")),
+    ("HISTORY", ("receipt", "bill", "check", "did i order")),
+    ("COMPLAINT", ("cold", "wrong", "terrible", "slow")),
+    ("STORE_INFO", ("wifi", "hour", "open", "close", "located", "parking")),
+    ("ORDER", ("i'll", "i want", "give me", "order", "add")),
+    ("MENU_QA", ("?", "menu", "recommend", "help")),
+]
+
+
+def load_dataset(path=DATASET_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def keyword_router(state):
+    text = message_content(state["messages"][-1]).lower()
+    for intent, keywords in KEYWORD_RULES:
+        if any(keyword in text for keyword in keywords):
+            return {"current_intent": intent}
+    return {"current_intent": "GREETING"}
+
+
+def make_state(row):
+    messages = []
+    if row.get("prev_ai_msg"):
+        messages.append(make_message(ROLE_ASSISTANT, row["prev_ai_msg"]))
+    messages.append(make_message(ROLE_USER, row["message"]))
+    return {"messages": messages, "cart": {}}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def evaluate(labels, predictions, latencies_ms):
+    """정확도, 의도별 precision/recall/F1, 혼동 행렬, 지연 시간 백분위수"""
+    confusion = {gold: {pred: 0 for pred in INTENTS} for gold in INTENTS}
+    for gold, pred in zip(labels, predictions):
+        confusion[gold][pred] += 1
+
+    per_intent = {}
+    for intent in INTENTS:
+        tp = confusion[intent][intent]
+        predicted = sum(confusion[gold][intent] for gold in INTENTS)
+        actual = sum(confusion[intent].values())
+        precision = tp / predicted if predicted else 0.0
+        recall = tp / actual if actual else 0.0
+        f1 = (
+            2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        )
+        per_intent[intent] = {
+            "precision": precision,
+            "recall": recall,
+            "f1": f1,
+            "support": actual,
+        }
+
+    correct = sum(gold == pred for gold, pred in zip(labels, predictions))
+    return {
+        "accuracy": correct / len(labels) if labels else 0.0,
+        "per_intent": per_intent,
+        "confusion": confusion,
+        "latency_ms": {
+            "p50": percentile(latencies_ms, 50),
+            "p90": percentile(latencies_ms, 90),
+            "p99": percentile(latencies_ms, 99),
+            "mean": sum(latencies_ms) / len(latencies_ms) if latencies_ms else 0.0,
+        },
+    }
+
+
+def run_router(router, dataset):
+    predictions = []
+    latencies_ms = []
+    for row in dataset:
+        state = make_state(row)
+        started = time.perf_counter()
+        result = router(state)
+        latencies_ms.append((time.perf_counter() - started) * 1000)
+        predictions.append(result["current_intent"])
+    return predictions, latencies_ms
+
+
+def print_report(reports):
+    names = list(reports)
+
+    print(f"\n{'':<12}" + "".join(f"{name:>24}" for name in names))
+    print(
+        f"{'accuracy':<12}" + "".join(f"{reports[n]['accuracy']:>24.2%}" for n in names)
+    )
+    for key in ("p50", "p90", "p99"):
+        print(
+            f"{key + ' ms':<12}"
+            + "".join(f"{reports[n]['latency_ms'][key]:>24.1f}" for n in names)
+        )
+
+    print(f"\n{'P / R / F1':<12}" + "".join(f"{name:>24}" for name in names))
+    for intent in INTENTS:
+        cells = []
+        for name in names:
+            m = reports[name]["per_intent"][intent]
+            cells.append(
+                f"{m['precision']:.2f} / {m['recall']:.2f} / {m['f1']:.2f}".rjust(24)
+            )
+        print(f"{intent:<12}" + "".join(cells))
+
+    for name in names:
+        print(f"\n🧮 Confusion matrix: {name} (rows=gold, cols=predicted)")
+        print(f"{'':<12}" + "".join(f"{intent[:6]:>8}" for intent in INTENTS))
+        for gold in INTENTS:
+            row = reports[name]["confusion"][gold]
+            print(f"{gold:<12}" + "".join(f"{row[pred]:>8}" for pred in INTENTS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate intent routers")
+    parser.add_argument("--routers", default="llm,fused,keyword")
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--output", default=None, help="save JSON report")
+    args = parser.parse_args()
+
+    routers = {"keyword": keyword_router}
+    names = args.routers.split(",")
+    if {"llm", "fused"} & set(names):
+        # 모델 로드가 필요한 라우터만 지연 import
+        from app.agent.router import classify_and_extract, classify_intent
+
+        routers["llm"] = classify_intent
+        routers["fused"] = classify_and_extract
+
+    dataset = load_dataset(args.dataset)
+    labels = [row["intent"] for row in dataset]
+    print(f"🏷️ Evaluating {len(names)} routers on {len(dataset)} labeled messages...")
+
+    reports = {}
+    for name in names:
+        # 워밍업 (첫 호출의 컴파일/캐시 비용 제외)
+        routers[name](make_state(dataset[0]))
+        predictions, latencies_ms = run_router(routers[name], dataset)
+        reports[name] = evaluate(labels, predictions, latencies_ms)
+
+    print_report(reports)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+        print(f"\n📝 Report saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
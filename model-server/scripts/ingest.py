@@ -5,7 +5,8 @@ from langchain_core.documents import Document
 
 # 상위 디렉토리(app) 모듈 import 설정
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from app.rag import rag_engine
+from app.lexical import LexicalIndex
+from app.rag import LEXICAL_INDEX_PATH, rag_engine
 
 def load_json(filepath):
     if not os.path.exists(filepath):
@@ -55,6 +56,14 @@ def ingest():
         # rag_engine.vector_store.delete(delete_all=True)
         
         rag_engine.vector_store.add_documents(docs)
+
+        # 4. BM25 역색인 생성 (RagEngine이 시작 시 로드)
+        print(f"📚 Building lexical index at: {LEXICAL_INDEX_PATH}")
+        os.makedirs(os.path.dirname(LEXICAL_INDEX_PATH), exist_ok=True)
+        lexical_index = LexicalIndex.build(
+            [(doc.page_content, doc.metadata) for doc in docs]
+        )
+        lexical_index.save(LEXICAL_INDEX_PATH)
         print("✅ Ingestion Complete!")
     else:
         print("❌ No documents to upload.")
@@ -0,0 +1,276 @@
+import json
+import os
+from collections.abc import Mapping
+
+import numpy as np
+import yaml
+
+BASE_PATH = os.path.join(os.path.dirname(__file__), "..")
+CONFIG_PATH = os.path.join(BASE_PATH, "lora_config.yaml")
+OUTPUT_DIR = os.path.join(BASE_PATH, "data", "packed")
+
+SPLITS = ["train", "valid"]
+SEQUENCES_PER_SHARD = 1024
+DEFAULT_MAX_SEQ_LENGTH = 2048
+# mlx_lm.lora는 배치를 가장 긴 샘플 길이(32의 배수)로 패딩합니다 (비교 기준)
+BASELINE_PAD_TO = 32
+
+
+def load_config():
+    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+def load_jsonl(path):
+    if not os.path.exists(path):
+        print(f"⚠️ Warning: File not found at {path}")
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def chat_tokens(tokenizer, messages, add_generation_prompt=False) -> list:
+    """
+    apply_chat_template(tokenize=True) 결과를 토큰 ID 리스트로 반환합니다.
+    새 transformers 버전은 토큰 리스트 대신 BatchEncoding(dict)을 반환하므로
+    input_ids만 꺼내서 사용합니다.
+    """
+    rendered = tokenizer.apply_chat_template(
+        messages, tokenize=True, add_generation_prompt=add_generation_prompt
+    )
+    if isinstance(rendered, Mapping):
+        rendered = rendered["input_ids"]
+    return list(rendered)
+
+
+def tokenize_conversation(tokenizer, messages, mask_prompt=False):
+    """
+    Chat template을 적용해 토큰화하고 토큰별 loss mask를 만듭니다.
+    메시지를 하나씩 늘려가며 렌더링한 차이로 각 토큰이 어느 role의 것인지 구분합니다.
+    mask_prompt=True면 assistant 응답 토큰만 loss에 포함합니다. assistant 턴의
+    헤더(Gemma의 "<start_of_turn>model\n")는 생성 프롬프트로 주어지는 부분이므로
+    제외합니다.
+    반환값: (tokens, loss_mask, prefix_preserved)
+    템플릿이 접두사를 보존하지 않으면 role을 구분할 수 없어 전체 토큰을 loss에
+    포함하고 prefix_preserved=False를 반환합니다 (이때 mask_prompt는 적용되지 않음).
+    """
+    tokens = []
+    loss_mask = []
+    for i, message in enumerate(messages):
+        rendered = chat_tokens(tokenizer, messages[: i + 1])
+        if rendered[: len(tokens)] != tokens:
+            tokens = chat_tokens(tokenizer, messages)
+            return tokens, [1] * len(tokens), False
+
+        new_tokens = rendered[len(tokens) :]
+        if not mask_prompt:
+            weights = [1] * len(new_tokens)
+        elif message["role"] != "assistant":
+            weights = [0] * len(new_tokens)
+        else:
+            header = []
+            if i > 0:
+                header = chat_tokens(tokenizer, messages[:i], True)[len(tokens) :]
+            if new_tokens[: len(header)] != header:
+                header = []
+            weights = [0] * len(header) + [1] * (len(new_tokens) - len(header))
+
+        tokens.extend(new_tokens)
+        loss_mask.extend(weights)
+
+    return tokens, loss_mask, True
+
+
+def pack_sequences(lengths, seq_length):
+    """
+    First-fit decreasing으로 대화들을 seq_length 길이 시퀀스에 채워 넣습니다.
+    반환값: 시퀀스별 대화 인덱스 리스트
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    bins = []  # [남은 공간, [대화 인덱스...]]
+    for index in order:
+        length = min(lengths[index], seq_length)
+        for packed in bins:
+            if packed[0] >= length:
+                packed[0] -= length
+                packed[1].append(index)
+                break
+        else:
+            bins.append([seq_length - length, [index]])
+
+    return [indices for _, indices in bins]
+
+
+def baseline_padding(lengths, batch_size, seq_length):
+    """길이순 정렬 후 배치별로 가장 긴 샘플에 맞춰 패딩할 때의 패딩 토큰 수"""
+    ordered = sorted(min(length, seq_length) for length in lengths)
+    padding = 0
+    for start in range(0, len(ordered), batch_size):
+        batch = ordered[start : start + batch_size]
+        padded = BASELINE_PAD_TO * -(-batch[-1] // BASELINE_PAD_TO)
+        padded = min(padded, seq_length)
+        padding += sum(padded - length for length in batch)
+    return padding
+
+
+def write_shards(split, samples, packs, seq_length, output_dir):
+    """
+    패킹된 시퀀스를 메모리 맵(.npy) 샤드로 저장합니다.
+    - tokens: 토큰 ID (패딩은 0)
+    - segments: 시퀀스 안의 대화 번호 (1부터, 패딩은 0) -> 블록 대각 attention mask
+    - positions: 대화마다 0부터 다시 시작하는 position id
+    - loss_mask: loss에 포함할 토큰이면 1
+    """
+    shards = []
+    for shard_index, start in enumerate(range(0, len(packs), SEQUENCES_PER_SHARD)):
+        shard_packs = packs[start : start + SEQUENCES_PER_SHARD]
+        shape = (len(shard_packs), seq_length)
+        prefix = f"{split}_{shard_index:05d}"
+
+        arrays = {
+            "tokens": np.uint32,
+            "segments": np.uint16,
+            "positions": np.uint16,
+            "loss_mask": np.uint8,
+        }
+        files = {name: f"{prefix}.{name}.npy" for name in arrays}
+        maps = {
+            name: np.lib.format.open_memmap(
+                os.path.join(output_dir, files[name]),
+                mode="w+",
+                dtype=dtype,
+                shape=shape,
+            )
+            for name, dtype in arrays.items()
+        }
+
+        for row, indices in enumerate(shard_packs):
+            offset = 0
+            for segment, index in enumerate(indices, start=1):
+                tokens, loss_mask = samples[index]
+                length = min(len(tokens), seq_length)
+                end = offset + length
+                maps["tokens"][row, offset:end] = tokens[:length]
+                maps["segments"][row, offset:end] = segment
+                maps["positions"][row, offset:end] = np.arange(length)
+                maps["loss_mask"][row, offset:end] = loss_mask[:length]
+                offset = end
+
+        for array in maps.values():
+            array.flush()
+        shards.append({"files": files, "num_sequences": len(shard_packs)})
+
+    return shards
+
+
+class PackedDataset:
+    """
+    prepare()가 저장한 샤드를 메모리 맵으로 읽는 학습용 데이터셋
+    dataset[i] -> 패킹된 시퀀스 하나의 (tokens, segments, loss_mask) 배열
+    """
+
+    def __init__(self, output_dir: str, split: str):
+        manifest_path = os.path.join(output_dir, "manifest.json")
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if split not in self.manifest["splits"]:
+            raise ValueError(f"Split '{split}' not found in {manifest_path}")
+
+        self.seq_length = self.manifest["seq_length"]
+        self.shards = [
+            {
+                name: np.load(os.path.join(output_dir, file), mmap_mode="r")
+                for name, file in shard["files"].items()
+            }
+            for shard in self.manifest["splits"][split]["shards"]
+        ]
+        self._rows = [
+            (shard_index, row)
+            for shard_index, shard in enumerate(self.shards)
+            for row in range(len(shard["tokens"]))
+        ]
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        shard_index, row = self._rows[index]
+        shard = self.shards[shard_index]
+        return shard["tokens"][row], shard["segments"][row], shard["loss_mask"][row]
+
+
+def prepare():
+    # 토크나이저만 필요하므로 모델 가중치는 로드하지 않음
+    from transformers import AutoTokenizer
+
+    config = load_config()
+    model_id = config["model"]
+    seq_length = config.get("max_seq_length", DEFAULT_MAX_SEQ_LENGTH)
+    batch_size = config.get("batch_size", 4)
+    mask_prompt = config.get("mask_prompt", False)
+    data_dir = os.path.join(BASE_PATH, config["data"])
+
+    print(f"🔤 Loading tokenizer: {model_id}")
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    manifest = {
+        "model": model_id,
+        "seq_length": seq_length,
+        "mask_prompt": mask_prompt,
+        "splits": {},
+    }
+
+    for split in SPLITS:
+        rows = load_jsonl(os.path.join(data_dir, f"{split}.jsonl"))
+        if not rows:
+            continue
+
+        print(f"📦 Tokenizing {len(rows)} conversations ({split})...")
+        samples = []
+        mask_fallbacks = 0
+        for row in rows:
+            tokens, loss_mask, prefix_preserved = tokenize_conversation(
+                tokenizer, row["messages"], mask_prompt
+            )
+            samples.append((tokens, loss_mask))
+            mask_fallbacks += not prefix_preserved
+        if mask_fallbacks and mask_prompt:
+            print(
+                f"⚠️ Warning: chat template does not preserve prefixes for "
+                f"{mask_fallbacks} conversations ({split}); mask_prompt ignored "
+                f"for them (all tokens count toward the loss)"
+            )
+
+        lengths = [len(tokens) for tokens, _ in samples]
+        packs = pack_sequences(lengths, seq_length)
+        shards = write_shards(split, samples, packs, seq_length, OUTPUT_DIR)
+
+        total_tokens = sum(min(length, seq_length) for length in lengths)
+        packed_padding = len(packs) * seq_length - total_tokens
+        unpacked_padding = baseline_padding(lengths, batch_size, seq_length)
+        manifest["splits"][split] = {
+            "num_conversations": len(rows),
+            "num_sequences": len(packs),
+            "num_tokens": total_tokens,
+            "truncated": sum(length > seq_length for length in lengths),
+            "mask_fallbacks": mask_fallbacks,
+            "padding_tokens": packed_padding,
+            "baseline_padding_tokens": unpacked_padding,
+            "shards": shards,
+        }
+
+        print(
+            f"✅ {split}: {len(rows)} conversations -> {len(packs)} sequences, "
+            f"padding {unpacked_padding} -> {packed_padding} tokens "
+            f"({unpacked_padding - packed_padding} eliminated)"
+        )
+
+    manifest_path = os.path.join(OUTPUT_DIR, "manifest.json")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"📝 Manifest saved to: {manifest_path}")
+
+
+if __name__ == "__main__":
+    prepare()
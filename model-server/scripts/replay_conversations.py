@@ -0,0 +1,62 @@
+import argparse
+import json
+import os
+import sys
+
+# 상위 디렉토리(app) 모듈 import 설정
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app.batch import BatchError, run_batch  # noqa: E402
+
+
+def load_conversations(path):
+    """JSONL: 한 줄에 {"id": "...", "messages": ["user turn 1", "user turn 2", ...]}"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_transcripts(f, transcripts: list):
+    for transcript in transcripts:
+        f.write(json.dumps(transcript, ensure_ascii=False) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay conversation scripts offline")
+    parser.add_argument("input", help="conversation scripts (.jsonl)")
+    parser.add_argument("output", help="transcripts output (.jsonl)")
+    parser.add_argument("--adapter", default=None, help="LoRA adapter name")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-tokens", type=int, default=500)
+    args = parser.parse_args()
+
+    conversations = load_conversations(args.input)
+    print(f"🎬 Replaying {len(conversations)} conversations...")
+
+    total_tokens = 0
+    total_seconds = 0.0
+    with open(args.output, "w", encoding="utf-8") as f:
+        for start in range(0, len(conversations), args.batch_size):
+            chunk = conversations[start : start + args.batch_size]
+            try:
+                transcripts, stats = run_batch(
+                    chunk, adapter=args.adapter, max_tokens=args.max_tokens
+                )
+            except BatchError as e:
+                # 완료된 턴까지의 기록은 저장하고 중단
+                write_transcripts(f, e.transcripts)
+                print(f"❌ Replay failed at conversation {start}: {e}")
+                sys.exit(1)
+            write_transcripts(f, transcripts)
+
+            total_tokens += stats["generated_tokens"]
+            total_seconds += stats["elapsed_seconds"]
+            print(
+                f"📦 {start + len(chunk)}/{len(conversations)} "
+                f"({stats['tokens_per_sec']:.1f} tokens/sec)"
+            )
+
+    throughput = total_tokens / total_seconds if total_seconds else 0.0
+    print(f"✅ Saved transcripts to {args.output} ({throughput:.1f} tokens/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import os
+import sys
+
+import mlx.core as mx
+import mlx.nn as nn
+import mlx.optimizers as optim
+import numpy as np
+from mlx_lm import load
+from mlx_lm.lora import CONFIG_DEFAULTS
+from mlx_lm.tuner.callbacks import TrainingCallback
+from mlx_lm.tuner.trainer import TrainingArgs, train
+from mlx_lm.tuner.utils import (
+    build_schedule,
+    linear_to_lora_layers,
+    print_trainable_parameters,
+)
+from mlx_lm.utils import save_config
+
+# 상위 디렉토리(scripts) 모듈 import 설정
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from scripts.prepare_dataset import (  # noqa: E402
+    BASE_PATH,
+    OUTPUT_DIR,
+    PackedDataset,
+    load_config,
+)
+
+OPTIMIZERS = {"adam": optim.Adam, "adamw": optim.AdamW}
+
+
+def segment_attention_mask(segments, window_size=None):
+    """
+    (B, L) 대화 번호 -> (B, 1, L, L) bool mask
+    같은 대화 안에서만 causal attention을 허용하는 블록 대각 mask입니다.
+    Gemma 3의 RoPE는 상대 위치만 반영하므로, 대화가 서로를 보지 못하면
+    position id를 대화마다 0부터 다시 시작한 것과 같은 결과가 됩니다.
+    """
+    positions = mx.arange(segments.shape[1])
+    causal = positions[:, None] >= positions[None]
+    if window_size is not None:
+        # sliding window 레이어는 최근 window_size개 토큰만 봄
+        causal = causal & (positions[:, None] < positions[None] + window_size)
+    same_segment = segments[:, :, None] == segments[:, None, :]
+    return (same_segment & causal)[:, None]
+
+
+class SegmentMask:
+    """
+    mlx_lm 모델은 attention mask를 cache.make_mask()로 만듭니다.
+    학습 forward에서 KV 캐시 자리에 이 객체를 넘겨 블록 대각 mask를 주입합니다.
+    (키/값은 저장하지 않고 그대로 통과시킴)
+    """
+
+    offset = 0
+
+    def __init__(self, segments):
+        self.segments = segments
+
+    def update_and_fetch(self, keys, values):
+        return keys, values
+
+    def make_mask(self, n, return_array=False, window_size=None):
+        return segment_attention_mask(self.segments, window_size)
+
+
+def target_weights(segments, loss_mask):
+    """
+    다음 토큰 예측 위치별 loss 가중치 (B, L - 1)
+    다음 토큰이 같은 대화에 속하고 loss_mask가 1인 위치만 학습합니다.
+    (대화 경계를 넘는 예측과 패딩은 제외)
+    """
+    same_segment = segments[:, 1:] == segments[:, :-1]
+    return loss_mask[:, 1:] * same_segment * (segments[:, 1:] > 0)
+
+
+def packed_loss(model, tokens, segments, loss_mask):
+    inputs = tokens[:, :-1]
+    targets = tokens[:, 1:]
+
+    cache = [SegmentMask(segments[:, :-1])] * len(model.layers)
+    logits = model(inputs, cache=cache)
+
+    weights = target_weights(segments, loss_mask)
+    ce = nn.losses.cross_entropy(logits, targets) * weights
+    ntoks = weights.sum()
+    ce = ce.astype(mx.float32).sum() / ntoks
+
+    return ce, ntoks
+
+
+def iterate_packed_batches(
+    dataset,
+    batch_size,
+    max_seq_length,
+    loop=False,
+    seed=None,
+    comm_group=None,
+):
+    """
+    trainer.train()의 iterate_batches 대체
+    패킹된 시퀀스를 batch_size개씩 묶어 (tokens, segments, loss_mask)를 yield 합니다.
+    시퀀스 수가 batch_size보다 적으면 있는 만큼만 묶습니다.
+    """
+    rows = list(range(len(dataset)))
+    if comm_group is not None and comm_group.size() > 1:
+        rows = rows[comm_group.rank() :: comm_group.size()]
+    batch_size = min(batch_size, len(rows))
+    if batch_size == 0:
+        raise ValueError("Packed dataset has no sequences")
+
+    batches = [
+        rows[i : i + batch_size]
+        for i in range(0, len(rows) - batch_size + 1, batch_size)
+    ]
+    if seed is not None:
+        np.random.seed(seed)
+
+    while True:
+        for index in np.random.permutation(len(batches)):
+            tokens, segments, loss_mask = (
+                np.stack(arrays)
+                for arrays in zip(*(dataset[i] for i in batches[index]))
+            )
+            # 모든 시퀀스가 끝난 뒤의 패딩 열은 잘라서 계산량을 줄임
+            used = int(np.flatnonzero(segments.any(axis=0))[-1]) + 1
+            used = min(used, max_seq_length)
+            yield (
+                mx.array(tokens[:, :used].astype(np.int32)),
+                mx.array(segments[:, :used].astype(np.int32)),
+                mx.array(loss_mask[:, :used].astype(np.float32)),
+            )
+
+        if not loop:
+            break
+
+
+class MetricCallback(TrainingCallback):
+    """학습/검증 loss를 log(key, value, step) 함수로 전달 (MetricLogger.log)"""
+
+    def __init__(self, log):
+        self.log = log
+
+    def on_train_loss_report(self, train_info: dict):
+        self.log("train_loss", train_info["train_loss"], step=train_info["iteration"])
+
+    def on_val_loss_report(self, val_info: dict):
+        # mlx_lm은 검증 iteration을 it - 1로 넘기므로 stdout("Iter {it}")과 맞춤
+        self.log("val_loss", val_info["val_loss"], step=val_info["iteration"] + 1)
+
+
+def train_packed(config: dict, training_callback=None, data_dir: str = OUTPUT_DIR):
+    """
+    prepare_dataset.py가 만든 샤드로 LoRA 어댑터를 학습합니다.
+    mlx_lm.lora와 같은 설정(lora_config.yaml)과 학습 루프를 쓰고,
+    배치 구성과 loss만 패킹된 시퀀스용으로 바꿉니다.
+    """
+    args = {**CONFIG_DEFAULTS, **config}
+    train_set = PackedDataset(data_dir, "train")
+    valid_set = PackedDataset(data_dir, "valid")
+    if train_set.manifest["model"] != args["model"]:
+        raise ValueError(
+            f"Packed data was tokenized for {train_set.manifest['model']}, "
+            f"but the config uses {args['model']}. Re-run prepare_dataset.py"
+        )
+
+    optimizer_name = args["optimizer"].lower()
+    if optimizer_name not in OPTIMIZERS:
+        raise ValueError(f"Unsupported optimizer for packed training: {optimizer_name}")
+
+    mx.random.seed(args["seed"])
+    np.random.seed(args["seed"])
+
+    print(f"🚀 Loading model: {args['model']}")
+    model, _ = load(args["model"])
+    model.freeze()
+    linear_to_lora_layers(
+        model,
+        args["num_layers"],
+        args["lora_parameters"],
+        use_dora=args["fine_tune_type"] == "dora",
+    )
+    print_trainable_parameters(model)
+
+    # 서빙 엔진(register_adapter)이 읽는 adapter_config.json도 함께 저장
+    adapter_path = os.path.join(BASE_PATH, args["adapter_path"])
+    os.makedirs(adapter_path, exist_ok=True)
+    save_config(dict(args), os.path.join(adapter_path, "adapter_config.json"))
+
+    print(
+        f"📦 Training on {len(train_set)} packed sequences "
+        f"({train_set.manifest['splits']['train']['num_conversations']} "
+        f"conversations, seq_length {train_set.seq_length})"
+    )
+    learning_rate = (
+        build_schedule(args["lr_schedule"])
+        if args["lr_schedule"]
+        else args["learning_rate"]
+    )
+    train(
+        model=model,
+        optimizer=OPTIMIZERS[optimizer_name](
+            learning_rate=learning_rate,
+            **args["optimizer_config"].get(optimizer_name, {}),
+        ),
+        train_dataset=train_set,
+        val_dataset=valid_set,
+        args=TrainingArgs(
+            batch_size=args["batch_size"],
+            iters=args["iters"],
+            val_batches=args["val_batches"],
+            steps_per_report=args["steps_per_report"],
+            steps_per_eval=args["steps_per_eval"],
+            steps_per_save=args["save_every"],
+            adapter_file=os.path.join(adapter_path, "adapters.safetensors"),
+            max_seq_length=train_set.seq_length,
+            grad_checkpoint=args["grad_checkpoint"],
+            grad_accumulation_steps=args["grad_accumulation_steps"],
+        ),
+        loss=packed_loss,
+        iterate_batches=iterate_packed_batches,
+        training_callback=training_callback,
+    )
+
+
+if __name__ == "__main__":
+    train_packed(load_config())
@@ -1,9 +1,18 @@
+import argparse
+import glob
+import json
 import os
+import queue
 import re
 import subprocess
 import sys
+import threading
+import time
+import traceback
 
 import mlflow
+from mlflow.entities import Metric
+from mlflow.tracking import MlflowClient
 
 # MLflow 서버 주소 (5001번 포트 확인!)
 MLFLOW_TRACKING_URI = "http://localhost:5001"
@@ -14,82 +23,271 @@ os.environ["MLFLOW_S3_ENDPOINT_URL"] = "http://localhost:9000"
 os.environ["AWS_ACCESS_KEY_ID"] = "minioadmin"
 os.environ["AWS_SECRET_ACCESS_KEY"] = "minioadmin"
 
+# 메트릭 배치 로깅 설정
+FLUSH_BATCH_SIZE = 200  # 이만큼 쌓이면 즉시 전송 (MLflow log_batch 한도 1000)
+FLUSH_INTERVAL_SECONDS = 5.0  # 최대 대기 시간
+# 트래킹 서버 장애 시 메트릭을 보관하는 스풀 디렉토리 (다음 실행 때 재전송)
+SPOOL_DIR = os.path.join(os.path.dirname(__file__), "..", "mlflow_spool")
 
-def train_and_log():
-    mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
-    mlflow.set_experiment(EXPERIMENT_NAME)
+_STOP = object()  # 백그라운드 스레드 종료 신호
 
-    print("🚀 Starting training wrapper...")
 
-    with mlflow.start_run() as run:
-        mlflow.log_param("model", "gemma-3-4b-it-4bit")
-        mlflow.log_param("method", "LoRA")
+class MetricLogger:
+    """
+    파싱한 메트릭을 큐에 쌓아두고 백그라운드 스레드에서 log_batch로 전송합니다.
+    stdout을 읽는 메인 스레드는 네트워크 호출을 기다리지 않으므로
+    트래킹 서버가 느려도 학습 프로세스의 출력이 막히지 않습니다.
+    전송에 실패한 메트릭은 스풀 파일(JSONL)에 저장했다가 서버가 살아나면 재전송합니다.
+    """
 
-        # [핵심 변경 1] 환경변수 설정
-        # PYTHONUNBUFFERED: 파이썬 출력 버퍼링 끄기
-        # TQDM_DISABLE: 진행 바 끄기 (로그 막힘 방지)
-        env = os.environ.copy()
-        env["PYTHONUNBUFFERED"] = "1"
-        env["TQDM_DISABLE"] = "1"
-
-        # 프로세스 실행
-        process = subprocess.Popen(
-            [
-                sys.executable,
-                "-u",
-                "-m",
-                "mlx_lm.lora",
-                "--config",
-                "lora_config.yaml",
-                "--train",
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,  # stderr도 stdout으로 합쳐서 받음
-            text=True,
-            bufsize=1,  # 라인 버퍼링
-            cwd=os.path.join(os.path.dirname(__file__), ".."),
-            env=env,
-        )
+    def __init__(self, client: MlflowClient, run_id: str):
+        self.client = client
+        self.run_id = run_id
+        self.queue = queue.Queue()
+        self.spool_path = os.path.join(SPOOL_DIR, f"{run_id}.jsonl")
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self.logged = 0
+        self.spooled = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
 
-        print("📊 Process started. Waiting for logs...")
+    def log(self, key: str, value: float, step: int):
+        """메트릭을 큐에 넣고 바로 반환 (논블로킹)"""
+        self.queue.put(Metric(key, value, int(time.time() * 1000), step))
 
-        # 정규표현식 컴파일
-        iter_pattern = re.compile(r"Iter (\d+):")
-        train_loss_pattern = re.compile(r"Train loss (\d+\.\d+)")
-        val_loss_pattern = re.compile(r"Val loss (\d+\.\d+)")
+    def close(self):
+        """남은 메트릭을 모두 전송(또는 스풀)하고 스레드를 종료합니다."""
+        self.queue.put(_STOP)
+        self._thread.join()
+        print(
+            f"📈 Metric logging: {self.logged} logged, {self.spooled} spooled, "
+            f"max lag {self.max_lag:.2f}s"
+        )
 
-        # [핵심 변경 2] for 문 대신 while 문 사용
-        # readline()으로 한 줄씩 읽고 즉시 출력
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + FLUSH_INTERVAL_SECONDS
         while True:
-            line = process.stdout.readline()
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(batch)
+                return
+            if item is not None:
+                batch.append(item)
+
+            if len(batch) >= FLUSH_BATCH_SIZE or time.monotonic() >= deadline:
+                self._flush(batch)
+                batch = []
+                deadline = time.monotonic() + FLUSH_INTERVAL_SECONDS
+
+    def _flush(self, batch: list):
+        # 이전 장애로 쌓인 스풀을 먼저 재전송하여 순서를 최대한 유지
+        if not self._replay_spool():
+            self._spool(batch)
+            return
+        if not batch:
+            return
+
+        try:
+            self.client.log_batch(self.run_id, metrics=batch)
+        except Exception as e:
+            print(f"⚠️ MLflow logging failed, spooling {len(batch)} metrics: {e}")
+            self._spool(batch)
+            return
+
+        self.logged += len(batch)
+        now_ms = time.time() * 1000
+        self.last_lag = (now_ms - min(m.timestamp for m in batch)) / 1000
+        self.max_lag = max(self.max_lag, self.last_lag)
+        if self.last_lag > FLUSH_INTERVAL_SECONDS * 2:
+            print(
+                f"🐢 Metric logging lag {self.last_lag:.1f}s "
+                f"(queued: {self.queue.qsize()})"
+            )
+
+    def _spool(self, batch: list):
+        if not batch:
+            return
+        # 스풀 파일은 백그라운드 스레드만 읽고 쓰므로 별도 락이 필요 없습니다.
+        os.makedirs(SPOOL_DIR, exist_ok=True)
+        write_spool(self.spool_path, batch, mode="a")
+        self.spooled += len(batch)
+
+    def _replay_spool(self) -> bool:
+        """스풀 파일이 있으면 재전송합니다. 스풀이 비었으면 True."""
+        if not os.path.exists(self.spool_path):
+            return True
+        if not replay_spool_file(self.client, self.spool_path):
+            return False
+        print(f"♻️ Replayed spooled metrics for run {self.run_id}")
+        return True
+
+
+def write_spool(spool_path: str, metrics: list, mode: str = "a"):
+    """메트릭을 JSONL 스풀 파일에 씁니다."""
+    with open(spool_path, mode, encoding="utf-8") as f:
+        for m in metrics:
+            record = {
+                "key": m.key,
+                "value": m.value,
+                "timestamp": m.timestamp,
+                "step": m.step,
+            }
+            f.write(json.dumps(record) + "\n")
+
+
+def replay_spool_file(client: MlflowClient, spool_path: str) -> bool:
+    """
+    스풀 파일의 메트릭을 해당 run에 log_batch로 재전송하고, 성공하면 파일을 삭제합니다.
+    중간 청크에서 실패하면 이미 보낸 메트릭은 빼고 남은 것만 스풀에 다시 씁니다
+    (MLflow는 중복 메트릭을 걸러내지 않음).
+    """
+    run_id = os.path.splitext(os.path.basename(spool_path))[0]
+    with open(spool_path, "r", encoding="utf-8") as f:
+        metrics = [Metric(**json.loads(line)) for line in f if line.strip()]
+
+    for start in range(0, len(metrics), FLUSH_BATCH_SIZE):
+        try:
+            client.log_batch(run_id, metrics=metrics[start : start + FLUSH_BATCH_SIZE])
+        except Exception as e:
+            print(f"⚠️ Spool replay failed for run {run_id}: {e}")
+            if start > 0:
+                tmp_path = f"{spool_path}.tmp"
+                write_spool(tmp_path, metrics[start:], mode="w")
+                os.replace(tmp_path, spool_path)
+            return False
+
+    os.remove(spool_path)
+    return True
+
+
+def replay_spools(client: MlflowClient):
+    """이전 실행에서 전송하지 못한 스풀 파일들을 재전송합니다."""
+    for spool_path in glob.glob(os.path.join(SPOOL_DIR, "*.jsonl")):
+        if replay_spool_file(client, spool_path):
+            print(f"♻️ Replayed spooled metrics from {spool_path}")
+
 
-            # 프로세스가 종료되었고 더 이상 읽을 라인이 없으면 탈출
-            if not line and process.poll() is not None:
-                break
+def run_packed_training(metric_logger: MetricLogger) -> int:
+    """
+    prepare_dataset.py가 만든 패킹 샤드로 같은 프로세스에서 학습합니다.
+    메트릭은 stdout 파싱 대신 학습 콜백에서 바로 MetricLogger로 전달합니다.
+    """
+    # mlx는 패킹 학습에서만 필요하므로 지연 import
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+    from scripts.prepare_dataset import load_config
+    from scripts.train_packed import MetricCallback, train_packed
 
-            if line:
-                # 터미널에 즉시 출력 (공백 제거 후 출력)
-                print(line.strip())
+    try:
+        train_packed(load_config(), MetricCallback(metric_logger.log))
+    except Exception as e:
+        print(f"❌ Packed training failed: {e}")
+        traceback.print_exc()
+        return 1
+    return 0
 
-                # MLflow 메트릭 파싱
-                iter_match = iter_pattern.search(line)
-                if iter_match:
-                    step = int(iter_match.group(1))
 
-                    train_match = train_loss_pattern.search(line)
-                    if train_match:
-                        mlflow.log_metric(
-                            "train_loss", float(train_match.group(1)), step=step
-                        )
+def run_lora_subprocess(metric_logger: MetricLogger) -> int:
+    """mlx_lm.lora를 서브프로세스로 실행하고 stdout에서 loss를 파싱합니다."""
+    # [핵심 변경 1] 환경변수 설정
+    # PYTHONUNBUFFERED: 파이썬 출력 버퍼링 끄기
+    # TQDM_DISABLE: 진행 바 끄기 (로그 막힘 방지)
+    env = os.environ.copy()
+    env["PYTHONUNBUFFERED"] = "1"
+    env["TQDM_DISABLE"] = "1"
+
+    # 프로세스 실행
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-u",
+            "-m",
+            "mlx_lm.lora",
+            "--config",
+            "lora_config.yaml",
+            "--train",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,  # stderr도 stdout으로 합쳐서 받음
+        text=True,
+        bufsize=1,  # 라인 버퍼링
+        cwd=os.path.join(os.path.dirname(__file__), ".."),
+        env=env,
+    )
+
+    print("📊 Process started. Waiting for logs...")
+
+    # 정규표현식 컴파일
+    iter_pattern = re.compile(r"Iter (\d+):")
+    train_loss_pattern = re.compile(r"Train loss (\d+\.\d+)")
+    val_loss_pattern = re.compile(r"Val loss (\d+\.\d+)")
+
+    # [핵심 변경 2] for 문 대신 while 문 사용
+    # readline()으로 한 줄씩 읽고 즉시 출력
+    while True:
+        line = process.stdout.readline()
+
+        # 프로세스가 종료되었고 더 이상 읽을 라인이 없으면 탈출
+        if not line and process.poll() is not None:
+            break
+
+        if line:
+            # 터미널에 즉시 출력 (공백 제거 후 출력)
+            print(line.strip())
+
+            # MLflow 메트릭 파싱
+            iter_match = iter_pattern.search(line)
+            if iter_match:
+                step = int(iter_match.group(1))
+
+                train_match = train_loss_pattern.search(line)
+                if train_match:
+                    metric_logger.log(
+                        "train_loss", float(train_match.group(1)), step=step
+                    )
+
+                val_match = val_loss_pattern.search(line)
+                if val_match:
+                    metric_logger.log("val_loss", float(val_match.group(1)), step=step)
+
+    return process.wait()
+
+
+def train_and_log(packed: bool = False):
+    mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
+    mlflow.set_experiment(EXPERIMENT_NAME)
+
+    print("🚀 Starting training wrapper...")
+
+    client = MlflowClient()
+    replay_spools(client)
+
+    with mlflow.start_run() as run:
+        mlflow.log_param("model", "gemma-3-4b-it-4bit")
+        mlflow.log_param("method", "LoRA")
+        mlflow.log_param("data", "packed" if packed else "jsonl")
+
+        metric_logger = MetricLogger(client, run.info.run_id)
+        if packed:
+            returncode = run_packed_training(metric_logger)
+        else:
+            returncode = run_lora_subprocess(metric_logger)
 
-                    val_match = val_loss_pattern.search(line)
-                    if val_match:
-                        mlflow.log_metric(
-                            "val_loss", float(val_match.group(1)), step=step
-                        )
+        # 남은 메트릭 전송 (실패분은 스풀에 남아 다음 실행 때 재전송)
+        metric_logger.close()
+        try:
+            mlflow.log_metric("metric_logging_max_lag_seconds", metric_logger.max_lag)
+        except Exception as e:
+            print(f"⚠️ Could not log metric lag: {e}")
 
         # 종료 코드 확인
-        if process.returncode == 0:
+        if returncode == 0:
             print("\n✅ Training finished successfully!")
 
             adapter_dir = os.path.join(os.path.dirname(__file__), "..", "adapters")
@@ -97,9 +295,15 @@ def train_and_log():
                 print("📦 Uploading artifacts to MLflow...")
                 mlflow.log_artifacts(adapter_dir, artifact_path="lora_adapter")
         else:
-            print(f"\n❌ Training failed with code {process.returncode}")
-            sys.exit(process.returncode)
+            print(f"\n❌ Training failed with code {returncode}")
+            sys.exit(returncode)
 
 
 if __name__ == "__main__":
-    train_and_log()
+    parser = argparse.ArgumentParser(description="Fine-tune with MLflow logging")
+    parser.add_argument(
+        "--packed",
+        action="store_true",
+        help="train from data/packed shards (run scripts/prepare_dataset.py first)",
+    )
+    train_and_log(packed=parser.parse_args().packed)
@@ -1,6 +1,7 @@
 import pytest
 
 from app.agent.handlers import (
+    handle_cancel,
     handle_complaint,
     handle_greeting,
     handle_history,
@@ -8,13 +9,19 @@ from app.agent.handlers import (
     handle_order,
     handle_store_info,
 )
-from app.agent.state import AgentState, Intent
+from app.agent.state import (
+    ROLE_ASSISTANT,
+    ROLE_USER,
+    AgentState,
+    Intent,
+    make_message,
+)
 
 
 @pytest.fixture
 def sample_state() -> AgentState:
     return {
-        "messages": [{"role": "user", "content": "Hello!"}],
+        "messages": [make_message(ROLE_USER, "Hello!")],
         "current_intent": Intent.GREETING.value,
         "final_response": "",
         "temperature": 0.7,
@@ -33,7 +40,7 @@ def test_handle_greeting_returns_valid_prompt(sample_state):
 
 def test_handle_order_returns_valid_prompt(sample_state):
     sample_state["messages"] = [
-        {"role": "user", "content": "I want a classic burger please"}
+        make_message(ROLE_USER, "I want a classic burger please")
     ]
 
     result = handle_order(sample_state)
@@ -44,9 +51,24 @@ def test_handle_order_returns_valid_prompt(sample_state):
     assert "temperature" in result
 
 
+def test_handle_order_searches_previous_suggestion_on_affirmative_turn(
+    sample_state, mock_rag_engine
+):
+    sample_state["messages"] = [
+        make_message(ROLE_ASSISTANT, "How about the Neural Shake for $4.99?"),
+        make_message(ROLE_USER, "Yes, I'll take that"),
+    ]
+
+    handle_order(sample_state)
+
+    query = mock_rag_engine.search.call_args.args[0]
+    assert "Neural Shake" in query
+    assert mock_rag_engine.search.call_args.kwargs["k"] == 10
+
+
 def test_handle_menu_qa_returns_valid_prompt(sample_state):
     sample_state["messages"] = [
-        {"role": "user", "content": "What are your most popular items?"}
+        make_message(ROLE_USER, "What are your most popular items?")
     ]
 
     result = handle_menu_qa(sample_state)
@@ -58,9 +80,7 @@ def test_handle_menu_qa_returns_valid_prompt(sample_state):
 
 
 def test_handle_store_info_returns_valid_prompt(sample_state):
-    sample_state["messages"] = [
-        {"role": "user", "content": "What are your opening hours?"}
-    ]
+    sample_state["messages"] = [make_message(ROLE_USER, "What are your opening hours?")]
 
     result = handle_store_info(sample_state)
 
@@ -72,7 +92,7 @@ def test_handle_store_info_returns_valid_prompt(sample_state):
 
 def test_handle_complaint_returns_valid_prompt(sample_state):
     sample_state["messages"] = [
-        {"role": "user", "content": "My burger is cold and the service is terrible!"}
+        make_message(ROLE_USER, "My burger is cold and the service is terrible!")
     ]
 
     result = handle_complaint(sample_state)
@@ -85,9 +105,9 @@ def test_handle_complaint_returns_valid_prompt(sample_state):
 
 def test_handle_history_with_conversation(sample_state):
     sample_state["messages"] = [
-        {"role": "user", "content": "I want a burger"},
-        {"role": "assistant", "content": "Great choice! Which one?"},
-        {"role": "user", "content": "What did I order?"},
+        make_message(ROLE_USER, "I want a burger"),
+        make_message(ROLE_ASSISTANT, "Great choice! Which one?"),
+        make_message(ROLE_USER, "What did I order?"),
     ]
 
     result = handle_history(sample_state)
@@ -100,9 +120,9 @@ def test_handle_history_with_conversation(sample_state):
 
 def test_handle_history_includes_conversation_context(sample_state):
     sample_state["messages"] = [
-        {"role": "user", "content": "Classic burger please"},
-        {"role": "assistant", "content": "One classic burger coming up!"},
-        {"role": "user", "content": "What did I just order?"},
+        make_message(ROLE_USER, "Classic burger please"),
+        make_message(ROLE_ASSISTANT, "One classic burger coming up!"),
+        make_message(ROLE_USER, "What did I just order?"),
     ]
 
     result = handle_history(sample_state)
@@ -110,3 +130,32 @@ def test_handle_history_includes_conversation_context(sample_state):
     prompt = result["final_response"]
     assert "USER:" in prompt or "user" in prompt.lower()
     assert "Classic burger" in prompt or "burger" in prompt.lower()
+
+
+def test_handle_history_with_cart_is_static(sample_state):
+    sample_state["cart"] = {"the-gemma-classic": 2}
+
+    result = handle_history(sample_state)
+
+    assert result["static_response"] is True
+    assert "2x The Gemma Classic ($8.99)" in result["final_response"]
+    assert "Total: $17.98" in result["final_response"]
+
+
+def test_handle_cancel_is_static_and_resets_cart(sample_state):
+    sample_state["messages"] = [make_message(ROLE_USER, "Cancel my order")]
+
+    result = handle_cancel(sample_state)
+
+    assert result["static_response"] is True
+    assert result["cart"] == [{"command": "RESET"}]
+    assert result["final_response"].startswith("Rosy: ")
+
+
+def test_handle_greeting_init_is_static(sample_state):
+    sample_state["messages"] = [make_message(ROLE_USER, "___INIT_GREETING___")]
+
+    result = handle_greeting(sample_state)
+
+    assert result["static_response"] is True
+    assert result["final_response"].startswith("Rosy: ")
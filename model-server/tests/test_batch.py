@@ -0,0 +1,221 @@
+import pytest
+from fastapi.testclient import TestClient
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, StateGraph
+
+from app import batch
+from app.agent.state import AgentState, Intent, message_content
+from app.batch import BatchError, run_batch
+
+ORDERS = {
+    "One classic please": "The Gemma Classic",
+    "A double stack": "Gemma Double Stack",
+}
+
+
+def scripted_turn(state: AgentState):
+    """메시지에 따라 정적 인사 / 주문 / 메뉴 질문 프롬프트를 만드는 테스트용 그래프"""
+    message = message_content(state["messages"][-1])
+    # 이 세션에 쌓인 메시지 수로 세션 격리를 확인
+    history = f"after {len(state['messages'])} messages"
+    if message == "Hi":
+        return {
+            "current_intent": Intent.GREETING.value,
+            "final_response": "Welcome!",
+            "static_response": True,
+        }
+    if message in ORDERS:
+        return {
+            "current_intent": Intent.ORDER.value,
+            "cart": [{"name": ORDERS[message], "quantity": 1}],
+            "final_response": f"ORDER {history}",
+            "temperature": 0.2,
+        }
+    return {
+        "current_intent": Intent.MENU_QA.value,
+        "final_response": f"QA {history}",
+        "temperature": 0.5,
+    }
+
+
+class StubEngine:
+    """generate_batch 호출을 기록하고 프롬프트를 그대로 돌려주는 엔진"""
+
+    def __init__(self):
+        self.calls = []
+        # fail_on번째 generate_batch 호출에서 fail_on_error 발생
+        self.fail_on = None
+        self.fail_on_error = None
+        self.tokenizer = self
+
+    def encode(self, text):
+        return text.split()
+
+    def encode_prompt_parts(self, parts):
+        return "".join(text for text, _ in parts)
+
+    def has_adapter(self, name):
+        return name is None
+
+    def generate_batch(self, prompts, adapters=None, max_tokens=200, temperature=0.0):
+        self.calls.append((list(prompts), temperature))
+        if self.fail_on is not None and len(self.calls) == self.fail_on:
+            raise self.fail_on_error
+        return [f"reply to {prompt}" for prompt in prompts]
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    workflow = StateGraph(AgentState)
+    workflow.add_node("turn", scripted_turn)
+    workflow.set_entry_point("turn")
+    workflow.add_edge("turn", END)
+    app = workflow.compile(checkpointer=MemorySaver())
+    monkeypatch.setattr(batch, "agent_app", app)
+    return app
+
+
+@pytest.fixture
+def stub_engine(monkeypatch):
+    engine = StubEngine()
+    monkeypatch.setattr(batch, "engine", engine)
+    return engine
+
+
+def test_run_batch_keeps_sessions_isolated(agent, stub_engine):
+    transcripts, stats = run_batch(
+        [
+            {"id": "a", "messages": ["One classic please", "What is vegan?"]},
+            {"messages": ["A double stack"]},
+        ]
+    )
+
+    first, second = transcripts
+    assert first["id"] == "a"
+    assert second["id"].startswith("batch-")
+    # 각 세션은 자기 대화와 카트만 봄 (두 번째 턴: user, assistant, user)
+    assert first["turns"][1]["response"] == "reply to QA after 3 messages"
+    assert second["turns"][0]["response"] == "reply to ORDER after 1 messages"
+    assert [item["name"] for item in first["turns"][1]["cart"]] == ["The Gemma Classic"]
+    assert [item["name"] for item in second["turns"][0]["cart"]] == [
+        "Gemma Double Stack"
+    ]
+    assert stats["conversations"] == 2
+    assert stats["turns"] == 3
+
+
+def test_run_batch_records_cart_and_intent_per_turn(agent, stub_engine):
+    transcripts, _ = run_batch(
+        [{"messages": ["One classic please", "What is vegan?", "A double stack"]}]
+    )
+
+    turns = transcripts[0]["turns"]
+    assert [turn["intent"] for turn in turns] == [
+        Intent.ORDER.value,
+        Intent.MENU_QA.value,
+        Intent.ORDER.value,
+    ]
+    assert [[item["name"] for item in turn["cart"]] for turn in turns] == [
+        ["The Gemma Classic"],
+        ["The Gemma Classic"],
+        ["The Gemma Classic", "Gemma Double Stack"],
+    ]
+
+
+def test_run_batch_skips_model_for_static_responses(agent, stub_engine):
+    transcripts, stats = run_batch(
+        [{"messages": ["Hi"]}, {"messages": ["One classic please"]}]
+    )
+
+    assert transcripts[0]["turns"][0]["response"] == "Welcome!"
+    assert transcripts[0]["turns"][0]["static"] is True
+    assert stats["model_calls_avoided"] == {Intent.GREETING.value: 1}
+    # 정적 응답은 생성 배치에 들어가지 않음
+    assert [len(prompts) for prompts, _ in stub_engine.calls] == [1]
+
+
+def test_run_batch_chunks_each_temperature_group(agent, stub_engine, monkeypatch):
+    monkeypatch.setattr(batch, "BATCH_CHUNK_SIZE", 2)
+
+    transcripts, _ = run_batch(
+        [{"messages": ["One classic please"]}] * 3 + [{"messages": ["Menu?"]}]
+    )
+
+    assert [(len(prompts), temp) for prompts, temp in stub_engine.calls] == [
+        (2, 0.2),
+        (1, 0.2),
+        (1, 0.5),
+    ]
+    assert [t["turns"][0]["timings"]["batch_size"] for t in transcripts] == [2, 2, 1, 1]
+
+
+def test_run_batch_deletes_sessions(agent, stub_engine):
+    run_batch([{"messages": ["One classic please"]}, {"messages": ["Hi"]}])
+
+    assert list(agent.checkpointer.list(None)) == []
+
+
+def test_run_batch_failure_returns_completed_turns(agent, stub_engine):
+    stub_engine.fail_on = 2
+    stub_engine.fail_on_error = ValueError("bad prompt")
+
+    with pytest.raises(BatchError) as error:
+        run_batch([{"messages": ["One classic please", "What is vegan?"]}])
+
+    assert [turn["user"] for turn in error.value.transcripts[0]["turns"]] == [
+        "One classic please"
+    ]
+    assert error.value.stats["turns"] == 1
+    assert list(agent.checkpointer.list(None)) == []
+
+
+@pytest.fixture
+def client(agent, stub_engine, monkeypatch):
+    from app import main
+
+    monkeypatch.setattr(main, "engine", stub_engine)
+    monkeypatch.setattr(main, "model_calls_avoided", main.Counter())
+    return TestClient(main.app)
+
+
+def test_chat_batch_endpoint_returns_transcripts(client):
+    response = client.post(
+        "/chat/batch",
+        json={"conversations": [{"id": "a", "messages": ["Hi", "A double stack"]}]},
+    )
+
+    assert response.status_code == 200
+    turns = response.json()["conversations"][0]["turns"]
+    assert [turn["static"] for turn in turns] == [True, False]
+    assert turns[1]["cart"][0]["name"] == "Gemma Double Stack"
+    assert client.get("/stats/fast-path").json()["total"] == 1
+
+
+def test_chat_batch_endpoint_limits_conversations(client):
+    from app import main
+
+    conversations = [{"messages": ["Hi"]}] * (main.MAX_BATCH_CONVERSATIONS + 1)
+
+    response = client.post("/chat/batch", json={"conversations": conversations})
+
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize(
+    "error, status_code", [(RuntimeError("oom"), 503), (KeyError("x"), 500)]
+)
+def test_chat_batch_endpoint_keeps_partial_transcripts(
+    client, stub_engine, error, status_code
+):
+    stub_engine.fail_on = 2
+    stub_engine.fail_on_error = error
+
+    response = client.post(
+        "/chat/batch",
+        json={"conversations": [{"messages": ["A double stack", "Menu?"]}]},
+    )
+
+    assert response.status_code == status_code
+    body = response.json()
+    assert len(body["conversations"][0]["turns"]) == 1
+    assert body["stats"]["turns"] == 1
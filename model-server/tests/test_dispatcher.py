@@ -0,0 +1,229 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app import dispatcher
+from app.dispatcher import HashRing
+
+SESSIONS = [f"session-{i}" for i in range(2000)]
+
+
+def make_ring(*workers) -> HashRing:
+    ring = HashRing(virtual_nodes=64)
+    for worker in workers:
+        ring.add(worker)
+    return ring
+
+
+def test_hash_ring_is_session_affine():
+    ring = make_ring("w1", "w2", "w3")
+
+    assert all(ring.get(s) == ring.get(s) for s in SESSIONS)
+    assert {ring.get(s) for s in SESSIONS} == {"w1", "w2", "w3"}
+
+
+def test_hash_ring_join_only_moves_sessions_to_new_worker():
+    ring = make_ring("w1", "w2", "w3")
+    before = {s: ring.get(s) for s in SESSIONS}
+
+    ring.add("w4")
+
+    moved = [s for s in SESSIONS if ring.get(s) != before[s]]
+    assert all(ring.get(s) == "w4" for s in moved)
+    assert len(moved) < len(SESSIONS) / 2
+
+
+def test_hash_ring_leave_only_moves_sessions_of_removed_worker():
+    ring = make_ring("w1", "w2", "w3")
+    before = {s: ring.get(s) for s in SESSIONS}
+
+    ring.remove("w2")
+
+    moved = {s for s in SESSIONS if ring.get(s) != before[s]}
+    assert moved == {s for s in SESSIONS if before[s] == "w2"}
+
+
+def test_hash_ring_without_workers_returns_none():
+    assert HashRing().get("session") is None
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    monkeypatch.setattr(dispatcher, "recent_sessions", dispatcher.OrderedDict())
+    monkeypatch.setattr(dispatcher, "ring", make_ring("w1", "w2", "w3"))
+    return dispatcher.recent_sessions
+
+
+def test_touch_session_caps_and_ages_out_sessions(sessions, monkeypatch):
+    monkeypatch.setattr(dispatcher, "MAX_TRACKED_SESSIONS", 2)
+    monkeypatch.setattr(dispatcher, "SESSION_TTL_SECONDS", 10.0)
+
+    dispatcher.touch_session("a", "w1", now=0.0)
+    dispatcher.touch_session("b", "w1", now=1.0)
+    dispatcher.touch_session("a", "w1", now=2.0)
+    dispatcher.touch_session("c", "w1", now=3.0)
+    assert list(sessions) == ["a", "c"]
+
+    dispatcher.touch_session("d", "w1", now=12.5)
+    assert list(sessions) == ["c", "d"]
+
+
+def test_moved_session_is_counted_once_for_its_new_owner(sessions):
+    for session_id in SESSIONS[:200]:
+        dispatcher.touch_session(session_id, dispatcher.ring.get(session_id))
+    before = dispatcher._session_owners()
+
+    dispatcher.ring.remove("w2")
+
+    owners = dispatcher._session_owners()
+    assert len(owners) == 200
+    assert set(owners.values()) == {"w1", "w3"}
+    assert dispatcher._moved_sessions(before) == sum(
+        worker == "w2" for worker in before.values()
+    )
+
+
+@pytest.fixture
+def workers(monkeypatch):
+    """http://w1, http://w2 워커와 요청을 기록하는 mock transport"""
+
+    def use(handler):
+        def record(request):
+            requests.append(request)
+            return handler(request)
+
+        transport = httpx.MockTransport(record)
+        monkeypatch.setattr(
+            dispatcher, "client", httpx.AsyncClient(transport=transport)
+        )
+        return requests
+
+    requests = []
+    monkeypatch.setattr(dispatcher, "ring", make_ring("http://w1", "http://w2"))
+    monkeypatch.setattr(dispatcher, "recent_sessions", dispatcher.OrderedDict())
+    monkeypatch.setattr(dispatcher, "unhealthy_workers", set())
+    monkeypatch.setattr(
+        dispatcher,
+        "shard_stats",
+        {url: dispatcher._new_shard_stats() for url in ("http://w1", "http://w2")},
+    )
+    return use
+
+
+def test_chat_relay_releases_in_flight_after_streaming(monkeypatch):
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(200, stream=httpx.ByteStream(b"hi"))
+    )
+    monkeypatch.setattr(dispatcher, "client", httpx.AsyncClient(transport=transport))
+    monkeypatch.setattr(dispatcher, "ring", make_ring("http://w1"))
+    monkeypatch.setitem(
+        dispatcher.shard_stats,
+        "http://w1",
+        {"in_flight": 0, "requests": 0, "errors": 0},
+    )
+
+    response = TestClient(dispatcher.app).post("/chat", json={"message": "Hi"})
+
+    assert response.text == "hi"
+    assert dispatcher.shard_stats["http://w1"]["in_flight"] == 0
+    assert dispatcher.shard_stats["http://w1"]["requests"] == 1
+
+
+def test_chat_rejects_session_moved_to_another_worker(workers):
+    workers(lambda request: httpx.Response(200, stream=httpx.ByteStream(b"hi")))
+    client = TestClient(dispatcher.app)
+    owner = dispatcher.ring.get("s1")
+
+    assert client.post("/chat", json={"message": "Hi", "session_id": "s1"}).text == "hi"
+    dispatcher.ring.remove(owner)
+
+    # 새 워커에는 장바구니/대화 기록이 없으므로 다시 시작하라고 알림
+    response = client.post("/chat", json={"message": "Yes", "session_id": "s1"})
+    assert response.status_code == 409
+    # 이후 요청은 새 워커에 고정되어 이어짐
+    response = client.post("/chat", json={"message": "Hi", "session_id": "s1"})
+    assert response.status_code == 200
+    assert dispatcher.pinned_worker("s1") == dispatcher.ring.get("s1") != owner
+
+
+def test_check_workers_removes_dead_worker_and_readds_it(workers):
+    down = {"http://w2"}
+
+    def handler(request):
+        if f"{request.url.scheme}://{request.url.host}" in down:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, json={})
+
+    requests = workers(handler)
+
+    asyncio.run(dispatcher.check_workers())
+    assert dispatcher.ring.workers == ["http://w1"]
+    assert dispatcher.unhealthy_workers == {"http://w2"}
+    assert all(request.url.path == "/adapters" for request in requests)
+
+    down.clear()
+    asyncio.run(dispatcher.check_workers())
+    assert sorted(dispatcher.ring.workers) == ["http://w1", "http://w2"]
+    assert dispatcher.unhealthy_workers == set()
+
+
+def test_leave_worker_stops_health_check_from_readding_it(workers):
+    workers(lambda request: httpx.Response(200, json={}))
+    dispatcher.ring.remove("http://w2")
+    dispatcher.unhealthy_workers.add("http://w2")
+
+    response = TestClient(dispatcher.app).delete(
+        "/workers", params={"url": "http://w2"}
+    )
+    asyncio.run(dispatcher.check_workers())
+
+    assert response.status_code == 200
+    assert dispatcher.ring.workers == ["http://w1"]
+
+
+def test_batch_is_forwarded_to_least_loaded_worker(workers):
+    requests = workers(lambda request: httpx.Response(200, json={"ok": True}))
+    dispatcher.shard_stats["http://w1"]["in_flight"] = 3
+
+    response = TestClient(dispatcher.app).post(
+        "/chat/batch", json={"conversations": [{"messages": ["Hi"]}]}
+    )
+
+    assert response.json() == {"ok": True}
+    assert str(requests[0].url) == "http://w2/chat/batch"
+    assert json.loads(requests[0].content) == {"conversations": [{"messages": ["Hi"]}]}
+
+
+def test_adapter_registration_is_broadcast_to_every_worker(workers):
+    requests = workers(
+        lambda request: httpx.Response(200, json={"worker": request.url.host})
+    )
+
+    response = TestClient(dispatcher.app).post(
+        "/adapters", json={"name": "v2", "path": "adapters/v2"}
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "http://w1": {"status_code": 200, "body": {"worker": "w1"}},
+        "http://w2": {"status_code": 200, "body": {"worker": "w2"}},
+    }
+    assert {request.method for request in requests} == {"POST"}
+
+
+def test_stats_broadcast_reports_failed_worker(workers):
+    def handler(request):
+        if request.url.host == "w2":
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, json={"total": 1})
+
+    workers(handler)
+
+    response = TestClient(dispatcher.app).get("/stats/fast-path")
+
+    assert response.status_code == 502
+    assert response.json()["http://w1"]["body"] == {"total": 1}
+    assert response.json()["http://w2"]["status_code"] == 502
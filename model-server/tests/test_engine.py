@@ -0,0 +1,97 @@
+import json
+import re
+from functools import lru_cache
+
+import pytest
+
+from app.agent.utils import build_prompt_parts, render_prompt
+from app.engine import ADAPTER_CONFIG_FILE, ADAPTER_WEIGHTS_FILE, LLMEngine
+
+SPECIAL_TOKEN = r"<[a-z_]+>"
+
+
+class FakeTokenizer:
+    """Gemma(SentencePiece)처럼 앞 공백을 다음 단어 토큰에 붙이는 테스트용 토크나이저"""
+
+    def __init__(self):
+        self.vocab = {}
+
+    def encode(self, text, add_special_tokens=False):
+        pieces = re.findall(rf"{SPECIAL_TOKEN}|\n+|[^\S\n]*[^\s<]+|[^\S\n]+", text)
+        return [self.vocab.setdefault(piece, len(self.vocab)) for piece in pieces]
+
+    def apply_chat_template(self, messages, tokenize=False, add_generation_prompt=True):
+        content = messages[0]["content"].strip()
+        return f"<start_of_turn>user\n{content}<end_of_turn>\n<start_of_turn>model\n"
+
+
+@pytest.fixture
+def engine():
+    # 모델 로드 없이 토큰화 경로만 검증
+    llm = LLMEngine.__new__(LLMEngine)
+    llm.tokenizer = FakeTokenizer()
+    llm.spec_stats = {}
+    llm._chat_head, llm._chat_tail = llm._compile_chat_template()
+    llm._encode_static = lru_cache(maxsize=None)(llm._encode_tuple)
+    return llm
+
+
+@pytest.mark.parametrize(
+    "context, query",
+    [
+        ("The Gemma Classic - $8.99", "I want two burgers"),
+        ("Menu\n", "  What is in the Neural Shake?  "),
+        ("", "Hi"),
+    ],
+)
+def test_encode_prompt_parts_matches_full_prompt_tokenization(engine, context, query):
+    parts = build_prompt_parts("rosy", "Take the order.", context, query)
+
+    expected = engine._encode(engine._format_prompt(render_prompt(parts)))
+
+    assert engine.encode_prompt_parts(parts) == expected
+
+
+@pytest.mark.parametrize(
+    "config, missing",
+    [
+        ({"num_layers": 8}, "lora_parameters"),
+        ({"lora_parameters": {"rank": 8, "scale": 20.0}}, "num_layers"),
+        ({"num_layers": 8, "lora_parameters": {"rank": 8}}, "scale"),
+    ],
+)
+def test_register_adapter_rejects_incomplete_config(engine, tmp_path, config, missing):
+    (tmp_path / ADAPTER_CONFIG_FILE).write_text(json.dumps(config))
+    (tmp_path / ADAPTER_WEIGHTS_FILE).write_bytes(b"")
+
+    # KeyError(500)가 아니라 /adapters가 400으로 매핑하는 ValueError여야 함
+    with pytest.raises(ValueError, match=missing):
+        engine.register_adapter("broken", str(tmp_path))
+
+
+def test_unknown_speculative_mode_is_rejected(engine):
+    engine.model = object()
+    engine.speculative_mode = "off"
+
+    with pytest.raises(ValueError, match="Unknown speculative mode"):
+        next(engine.generate_text_stream("Hi", speculative="fast"))
+    assert "fast" not in engine.spec_stats
+
+
+def test_speculative_metrics_use_counted_drafts(engine):
+    engine.speculative_mode = "draft"
+    engine.spec_stats = {
+        "draft": {
+            "generated_tokens": 10,
+            "decode_tokens": 9,
+            "decode_seconds": 1.0,
+            "from_draft_tokens": 6,
+            "drafted_tokens": 12,
+            "target_passes": 4,
+        }
+    }
+
+    metrics = engine.speculative_metrics()["metrics"]["draft"]
+
+    assert metrics["acceptance_rate"] == 0.5
+    assert metrics["tokens_per_pass"] == 2.5
@@ -0,0 +1,34 @@
+from scripts.evaluate_router import evaluate, load_dataset, percentile
+
+
+def test_evaluate_computes_per_intent_precision_and_recall():
+    labels = ["ORDER", "ORDER", "MENU_QA", "HISTORY"]
+    predictions = ["ORDER", "MENU_QA", "MENU_QA", "HISTORY"]
+
+    report = evaluate(labels, predictions, [10.0, 20.0, 30.0, 40.0])
+
+    assert report["accuracy"] == 0.75
+    assert report["per_intent"]["ORDER"]["recall"] == 0.5
+    assert report["per_intent"]["MENU_QA"]["precision"] == 0.5
+    assert report["confusion"]["ORDER"]["MENU_QA"] == 1
+    assert report["latency_ms"]["p50"] == 30.0
+
+
+def test_percentile_handles_empty_and_single_values():
+    assert percentile([], 50) == 0.0
+    assert percentile([5.0], 99) == 5.0
+
+
+def test_labeled_dataset_covers_every_intent():
+    intents = {row["intent"] for row in load_dataset()}
+
+    assert intents == {
+        "GREETING",
+        "MENU_QA",
+        "STORE_INFO",
+        "ORDER",
+        "HISTORY",
+        "COMPLAINT",
+        "CANCEL",
+        "REMOVE",
+    }
@@ -0,0 +1,52 @@
+import pytest
+
+from app.lexical import LexicalIndex, tokenize
+
+
+@pytest.fixture
+def index() -> LexicalIndex:
+    return LexicalIndex.build(
+        [
+            (
+                "Menu Item: The Gemma Classic\nPrice: $8.99",
+                {"name": "The Gemma Classic", "type": "menu"},
+            ),
+            (
+                "Menu Item: Gemma Double Stack\nPrice: $12.99",
+                {"name": "Gemma Double Stack", "type": "menu"},
+            ),
+            (
+                "Menu Item: Python Fries\nPrice: $3.99",
+                {"name": "Python Fries", "type": "menu"},
+            ),
+            (
+                "[Facility] Free WiFi is available.",
+                {"category": "Facility", "type": "info"},
+            ),
+        ]
+    )
+
+
+def test_tokenize_strips_plurals():
+    assert tokenize("Two Gemma Double Stacks!") == ["two", "gemma", "double", "stack"]
+
+
+def test_match_names_finds_exact_and_near_exact_names(index):
+    assert index.match_names("Two Gemma Double Stacks please") == [1]
+    assert index.match_names("one gemma dubble stack") == [1]
+    assert index.match_names("gemma classic and python fries") == [0, 2]
+
+
+def test_search_ranks_by_bm25_and_applies_filter(index):
+    assert index.search("fries", k=3) == [2]
+    assert index.search("wifi", k=3, filter={"type": "menu"}) == []
+
+
+def test_save_and_load_round_trip(index, tmp_path):
+    path = tmp_path / "lexical_index.json"
+    index.save(str(path))
+
+    loaded = LexicalIndex.load(str(path))
+
+    assert loaded.search("double stack", k=1) == index.search("double stack", k=1)
+    assert loaded.content(2) == index.content(2)
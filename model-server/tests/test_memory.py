@@ -0,0 +1,75 @@
+import operator
+import tracemalloc
+from typing import Annotated, List, TypedDict
+
+import pytest
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, StateGraph
+
+from app.memory import MemoryProfiler
+
+
+class ChatState(TypedDict):
+    messages: Annotated[List[tuple], operator.add]
+    cart: dict
+
+
+def reply(state: ChatState):
+    return {"messages": [("assistant", "x" * 500)], "cart": {"python-fries": 1}}
+
+
+def make_checkpointer(turns_by_session: dict) -> MemorySaver:
+    workflow = StateGraph(ChatState)
+    workflow.add_node("reply", reply)
+    workflow.set_entry_point("reply")
+    workflow.add_edge("reply", END)
+
+    checkpointer = MemorySaver()
+    app = workflow.compile(checkpointer=checkpointer)
+    for session_id, turns in turns_by_session.items():
+        config = {"configurable": {"thread_id": session_id}}
+        for _ in range(turns):
+            app.invoke({"messages": [("user", "Hi")]}, config=config)
+    return checkpointer
+
+
+@pytest.fixture
+def profiler() -> MemoryProfiler:
+    checkpointer = make_checkpointer({"short": 1, "long": 20})
+    return MemoryProfiler(checkpointer, engine=None, rag_engine=None)
+
+
+def test_checkpointer_usage_includes_channel_blobs_per_session(profiler):
+    usage = profiler.checkpointer_usage()
+
+    # 20턴 세션의 messages 채널만 해도 버전마다 누적된 대화가 저장됨
+    assert usage["sessions"] == 2
+    assert usage["blob_bytes"] > 20 * 500
+    assert usage["bytes"] == usage["checkpoint_bytes"] + usage["blob_bytes"]
+    assert usage["largest_session"]["session_id"] == "long"
+    assert usage["largest_session"]["bytes"] > usage["blob_bytes"] / 2
+
+
+def test_heap_baselines_are_tracked_separately(profiler):
+    tracemalloc.start(1)
+    try:
+        profiler.heap_usage("logger")
+        retained = [bytearray(1024) for _ in range(100)]  # noqa: F841
+        # 수동 조회가 주기 로그의 비교 기준을 덮어쓰지 않아야 함
+        first_request = profiler.heap_usage("request")
+        logger = profiler.heap_usage("logger")
+    finally:
+        tracemalloc.stop()
+
+    assert first_request["tracing"] is True
+    assert first_request["growth"] == []
+    assert logger["growth"]
+
+
+def test_start_does_not_trace_heap_unless_enabled(profiler, monkeypatch):
+    monkeypatch.setattr(profiler, "_run", lambda: None)
+
+    profiler.start(heap_trace=False)
+
+    assert not tracemalloc.is_tracing()
+    assert profiler.heap_usage() == {"tracing": False}
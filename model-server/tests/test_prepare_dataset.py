@@ -0,0 +1,109 @@
+import json
+
+import numpy as np
+
+from scripts.prepare_dataset import (
+    PackedDataset,
+    baseline_padding,
+    pack_sequences,
+    tokenize_conversation,
+    write_shards,
+)
+
+
+class PrefixTokenizer:
+    """
+    메시지마다 [role 토큰, 내용 길이] 두 토큰을 이어 붙이는 테스트용 템플릿
+    생성 프롬프트(assistant 헤더)는 role 토큰 2 하나
+    """
+
+    def __init__(self, preserve_prefix=True, return_dict=False):
+        self.preserve_prefix = preserve_prefix
+        self.return_dict = return_dict
+
+    def apply_chat_template(self, messages, tokenize=True, add_generation_prompt=False):
+        tokens = []
+        for message in messages:
+            tokens += [1 if message["role"] == "user" else 2, len(message["content"])]
+        if add_generation_prompt:
+            tokens.append(2)
+        if not self.preserve_prefix:
+            # 마지막 메시지에 따라 앞부분이 바뀌는 템플릿
+            tokens = [len(messages)] + tokens
+        if self.return_dict:
+            # 새 transformers는 tokenize=True에서 BatchEncoding(dict)을 반환
+            return {"input_ids": tokens, "attention_mask": [1] * len(tokens)}
+        return tokens
+
+
+MESSAGES = [
+    {"role": "user", "content": "Hi"},
+    {"role": "assistant", "content": "Hello!"},
+]
+
+
+def test_pack_sequences_fills_bins_first_fit_decreasing():
+    packs = pack_sequences([5, 3, 4, 2, 8], seq_length=8)
+
+    assert packs == [[4], [0, 1], [2, 3]]
+
+
+def test_pack_sequences_truncates_long_conversations():
+    assert pack_sequences([12, 3], seq_length=8) == [[0], [1]]
+
+
+def test_baseline_padding_pads_each_batch_to_longest_sample():
+    # [2, 3] -> 32, [4, 5] -> 32, [8] -> 32
+    assert baseline_padding([5, 3, 4, 2, 8], batch_size=2, seq_length=64) == 138
+
+
+def test_tokenize_conversation_masks_prompt_and_assistant_header():
+    tokens, loss_mask, prefix_preserved = tokenize_conversation(
+        PrefixTokenizer(), MESSAGES, mask_prompt=True
+    )
+
+    assert tokens == [1, 2, 2, 6]
+    # user 턴과 assistant 헤더(2)는 제외, 응답 내용만 학습
+    assert loss_mask == [0, 0, 0, 1]
+    assert prefix_preserved is True
+
+
+def test_tokenize_conversation_accepts_dict_from_chat_template():
+    tokens, loss_mask, _ = tokenize_conversation(
+        PrefixTokenizer(return_dict=True), MESSAGES, mask_prompt=False
+    )
+
+    assert tokens == [1, 2, 2, 6]
+    assert loss_mask == [1, 1, 1, 1]
+
+
+def test_tokenize_conversation_reports_mask_fallback():
+    tokens, loss_mask, prefix_preserved = tokenize_conversation(
+        PrefixTokenizer(preserve_prefix=False), MESSAGES, mask_prompt=True
+    )
+
+    assert tokens == [2, 1, 2, 2, 6]
+    assert loss_mask == [1] * 5
+    assert prefix_preserved is False
+
+
+def test_packed_dataset_reads_shards_written_by_prepare(tmp_path):
+    samples = [([5, 6, 7], [0, 1, 1]), ([8, 9], [1, 1]), ([3, 4, 5, 6], [0, 0, 1, 1])]
+    packs = pack_sequences([len(tokens) for tokens, _ in samples], seq_length=6)
+    shards = write_shards("train", samples, packs, 6, str(tmp_path))
+    manifest = {
+        "model": "test",
+        "seq_length": 6,
+        "splits": {"train": {"shards": shards}},
+    }
+    (tmp_path / "manifest.json").write_text(json.dumps(manifest))
+
+    dataset = PackedDataset(str(tmp_path), "train")
+
+    assert len(dataset) == 2
+    tokens, segments, loss_mask = dataset[0]
+    # [3, 4, 5, 6] + [8, 9] 패킹, 남은 자리는 패딩(0)
+    assert tokens.tolist() == [3, 4, 5, 6, 8, 9]
+    assert segments.tolist() == [1, 1, 1, 1, 2, 2]
+    assert loss_mask.tolist() == [0, 0, 1, 1, 1, 1]
+    assert np.asarray(dataset[1][1]).tolist() == [1, 1, 1, 0, 0, 0]
@@ -0,0 +1,59 @@
+from app.agent.utils import (
+    PERSONAS,
+    PROMPTS,
+    build_prompt,
+    build_prompt_parts,
+    compile_template,
+    fill_template,
+    render_prompt,
+)
+
+
+def test_compile_template_moves_slot_whitespace_into_slot():
+    segments = compile_template("Hi {name}! Q: {user_query} A:", (("name", "Rosy"),))
+
+    assert segments == (
+        ("Hi Rosy! Q:", None),
+        ((" ", " "), "user_query"),
+        ("A:", None),
+    )
+
+
+def test_fill_template_marks_only_slots_as_dynamic():
+    segments = compile_template("Hi {name}! Q: {user_query}", (("name", "Rosy"),))
+
+    parts = fill_template(segments, user_query="one burger")
+
+    assert parts == [("Hi Rosy! Q:", True), (" one burger", False)]
+
+
+def test_build_prompt_parts_matches_str_format():
+    persona = PERSONAS["rosy"]
+    expected = (
+        PROMPTS["common"]["base_template"]
+        .format(
+            name=persona["name"],
+            description=persona["description"],
+            task_instruction="Take the order.",
+            style=persona["style"],
+            prefix=persona["prefix"],
+            context_data="Menu",
+            user_query="A burger",
+        )
+        .strip()
+    )
+
+    parts = build_prompt_parts("rosy", "Take the order.", "Menu", "A burger")
+
+    dynamic = [text.strip() for text, is_static in parts if not is_static]
+    assert dynamic == ["Menu", "A burger"]
+    assert render_prompt(parts) == expected
+    assert build_prompt("rosy", "Take the order.", "Menu", "A burger") == expected
+
+
+def test_compile_template_keeps_escaped_braces():
+    segments = compile_template(PROMPTS["extraction"]["task"])
+
+    parts = fill_template(segments, menu_context="M", prev_ai_msg="P", user_query="U")
+
+    assert '{"name": "item_name"' in render_prompt(parts)
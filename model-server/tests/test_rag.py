@@ -0,0 +1,53 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.lexical import LexicalIndex
+from app.rag import RagEngine
+
+MENU = ["The Gemma Classic", "Gemma Double Stack", "Python Fries", "Neural Shake"]
+
+
+@pytest.fixture
+def rag() -> RagEngine:
+    # 임베딩/Pinecone 연결 없이 검색 경로만 검증
+    engine = RagEngine.__new__(RagEngine)
+    engine.lexical_index = LexicalIndex.build(
+        [(f"Menu Item: {name}", {"name": name, "type": "menu"}) for name in MENU]
+    )
+    engine._vector_search = MagicMock(return_value=["vector doc"])
+    return engine
+
+
+def test_search_returns_every_name_match_even_beyond_k(rag):
+    query = "Gemma Double Stack, Python Fries, a Neural Shake and The Gemma Classic"
+
+    docs = rag.search(query, k=3, filter={"type": "menu"})
+
+    assert sorted(docs) == sorted(f"Menu Item: {name}" for name in MENU)
+    rag._vector_search.assert_not_called()
+
+
+def test_search_caps_name_match_filler_at_name_match_k(rag):
+    docs = rag.search("Python Fries and any Gemma burger", k=10, name_match_k=2)
+
+    assert docs[0] == "Menu Item: Python Fries"
+    assert len(docs) == 2
+
+
+def test_search_without_name_match_keeps_k(rag):
+    rag._vector_search.return_value = [f"vector doc {i}" for i in range(10)]
+
+    docs = rag.search("something sweet", k=10, filter={"type": "menu"}, name_match_k=3)
+
+    # 이름이 없는 질문은 이전과 같은 k개를 RRF로 반환 (recall 유지)
+    rag._vector_search.assert_called_once_with("something sweet", 10, {"type": "menu"})
+    assert len(docs) == 10
+
+
+def test_search_without_lexical_index_uses_k(rag):
+    rag.lexical_index = None
+
+    rag.search("something sweet", k=10, filter={"type": "menu"}, name_match_k=3)
+
+    rag._vector_search.assert_called_once_with("something sweet", 10, {"type": "menu"})
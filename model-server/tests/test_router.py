@@ -0,0 +1,34 @@
+from app.agent.router import parse_fused_response, parse_intent
+from app.agent.state import Intent
+
+
+def test_parse_intent_falls_back_to_greeting():
+    assert parse_intent("MENU_QA") == Intent.MENU_QA.value
+    assert parse_intent("???") == Intent.GREETING.value
+
+
+def test_parse_fused_response_returns_intent_and_cart():
+    response = (
+        '{"intent": "ORDER", "cart": [{"name": "The Gemma Classic", "quantity": 2}]}'
+    )
+
+    intent, cart = parse_fused_response(response)
+
+    assert intent == Intent.ORDER.value
+    assert cart == [{"name": "The Gemma Classic", "quantity": 2}]
+
+
+def test_parse_fused_response_drops_cart_for_non_cart_intents():
+    response = '{"intent": "MENU_QA", "cart": [{"name": "Python Fries"}]}'
+
+    intent, cart = parse_fused_response(response)
+
+    assert intent == Intent.MENU_QA.value
+    assert cart == []
+
+
+def test_parse_fused_response_recovers_intent_from_broken_json():
+    intent, cart = parse_fused_response('{"intent": "HISTORY", "cart": [')
+
+    assert intent == Intent.HISTORY.value
+    assert cart == []
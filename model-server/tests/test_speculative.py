@@ -0,0 +1,169 @@
+import mlx.core as mx
+import pytest
+
+from app import speculative
+from app.speculative import find_draft
+
+
+def test_find_draft_copies_tokens_after_previous_ngram():
+    tokens = [1, 2, 3, 4, 5, 9, 9, 2, 3, 4]
+
+    assert find_draft(tokens, ngram_size=3, num_draft_tokens=4) == [5, 9, 9, 2]
+
+
+def test_find_draft_falls_back_to_shorter_ngram():
+    tokens = [5, 6, 7, 8, 6, 7]
+
+    assert find_draft(tokens, ngram_size=3, num_draft_tokens=2) == [8, 6]
+
+
+def test_find_draft_returns_empty_without_match():
+    assert find_draft([1, 2, 3], ngram_size=3, num_draft_tokens=4) == []
+
+
+VOCAB_SIZE = 16
+
+
+class FakeCache:
+    def __init__(self, max_size=None):
+        self.offset = 0
+        self.max_size = max_size
+
+
+class ScriptedModel:
+    """프롬프트 뒤 위치마다 정해진 토큰을 argmax로 내는 결정적 모델"""
+
+    def __init__(self, prompt_len, script):
+        self.prompt_len = prompt_len
+        self.script = script
+        self.wrapped_verify = False
+
+    def __call__(self, inputs, cache):
+        layer = cache[0]
+        length = inputs.shape[1]
+        rows = []
+        for pos in range(layer.offset, layer.offset + length):
+            index = pos + 1 - self.prompt_len
+            token = self.script[index] if 0 <= index < len(self.script) else 0
+            rows.append([10.0 if i == token else 0.0 for i in range(VOCAB_SIZE)])
+        layer.offset += length
+        # 프리필 이후의 다중 토큰 forward(드래프트 검증)가 윈도우를 넘었는지 기록
+        if layer.max_size and layer.offset > length and length > 1:
+            self.wrapped_verify |= layer.offset >= layer.max_size
+        return mx.array(rows)[None]
+
+
+def greedy(logprobs):
+    return mx.argmax(logprobs, axis=-1)
+
+
+def plain_greedy_decode(model, prompt, max_tokens):
+    cache = [FakeCache()]
+    out = []
+    inputs = list(prompt)
+    for _ in range(max_tokens):
+        logits = model(mx.array(inputs)[None], cache=cache)[0, -1:]
+        y = greedy(logits).tolist()[0]
+        out.append(y)
+        inputs = [y]
+    return out
+
+
+@pytest.fixture
+def fake_cache(monkeypatch):
+    """mlx_lm 캐시 함수 대체. window를 바꾸면 RotatingKVCache처럼 동작"""
+    window = {"max_size": None}
+
+    def trim(cache, num_tokens):
+        for layer in cache:
+            layer.offset -= num_tokens
+
+    def can_trim(cache):
+        return all(not c.max_size or c.offset < c.max_size for c in cache)
+
+    monkeypatch.setattr(
+        speculative,
+        "make_prompt_cache",
+        lambda model: [FakeCache(window["max_size"])],
+    )
+    monkeypatch.setattr(speculative, "can_trim_prompt_cache", can_trim)
+    monkeypatch.setattr(speculative, "trim_prompt_cache", trim)
+    return window
+
+
+@pytest.mark.parametrize(
+    "prompt, script, accepted",
+    [
+        # [1, 2] 뒤 드래프트 [3, 4, 5, 6] 중 3, 4만 일치 (부분 수락)
+        ([1, 2, 3, 4, 5, 6], [1, 2, 3, 4, 9, 9, 1, 2, 3, 4, 5, 7], "partial"),
+        # [1, 2] 뒤 드래프트 [3, 4, 1, 2]의 첫 토큰부터 불일치 (전부 거절)
+        ([1, 2, 3, 4], [1, 2, 9, 9, 8, 7], "none"),
+    ],
+)
+def test_prompt_lookup_matches_plain_greedy_decoding(
+    fake_cache, prompt, script, accepted
+):
+    model = ScriptedModel(len(prompt), script)
+    stats = {}
+
+    steps = list(
+        speculative.prompt_lookup_generate_step(
+            prompt, model, greedy, max_tokens=len(script), stats=stats
+        )
+    )
+
+    assert [token for token, _ in steps] == plain_greedy_decode(
+        model, prompt, len(script)
+    )
+    assert stats["drafted_tokens"] > stats["accepted_tokens"]
+    if accepted == "partial":
+        assert stats["accepted_tokens"] > 0
+        assert any(from_draft for _, from_draft in steps)
+    else:
+        assert stats["accepted_tokens"] == 0
+        assert not any(from_draft for _, from_draft in steps)
+
+
+def test_prompt_lookup_never_verifies_past_the_sliding_window(fake_cache):
+    prompt = [1, 2, 3, 4, 5, 6]
+    script = [1, 2, 3, 4, 5, 6, 1, 2, 3, 4, 5, 6]
+    # 프롬프트 + 생성 토큰이 윈도우(12)를 넘어가는 긴 응답
+    fake_cache["max_size"] = 12
+    model = ScriptedModel(len(prompt), script)
+    stats = {}
+
+    steps = list(
+        speculative.prompt_lookup_generate_step(
+            prompt, model, greedy, max_tokens=len(script), stats=stats
+        )
+    )
+
+    assert [token for token, _ in steps] == plain_greedy_decode(
+        model, prompt, len(script)
+    )
+    assert stats["accepted_tokens"] > 0
+    assert not model.wrapped_verify
+
+
+def test_draft_budget_stops_at_window_headroom():
+    cache = [FakeCache(), FakeCache(max_size=10)]
+    cache[1].offset = 6
+
+    assert speculative.draft_budget(cache, num_draft_tokens=4) == 2
+    cache[1].offset = 9
+    assert speculative.draft_budget(cache, num_draft_tokens=4) == 0
+
+
+def test_count_draft_passes_counts_drafts_per_verification_pass():
+    # 패스 1: 드래프트 4개 중 2개 수락 + 타겟 1개, 패스 2: 남은 1개만 드래프트
+    steps = [(5, None, True), (6, None, True), (7, None, False), (8, None, True)]
+    stats = {}
+
+    tokens = list(
+        speculative.count_draft_passes(
+            iter(steps), max_tokens=4, num_draft_tokens=4, stats=stats
+        )
+    )
+
+    assert tokens == [(5, True), (6, True), (7, False), (8, True)]
+    assert stats == {"target_passes": 2, "drafted_tokens": 5}
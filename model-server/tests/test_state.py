@@ -0,0 +1,94 @@
+import pytest
+
+from app.agent.menu import load_menu, resolve_item_id
+from app.agent.state import (
+    ROLE_USER,
+    append_messages,
+    cart_items,
+    make_message,
+    reduce_cart,
+)
+
+
+def test_reduce_cart_accumulates_by_catalog_id_without_mutating_input():
+    left = {"the-gemma-classic": 1}
+
+    cart = reduce_cart(
+        left,
+        [
+            {"name": "The Gemma Classic", "quantity": 1},
+            {"name": "python fries", "quantity": 2},
+            {"name": "Unicorn Burger", "quantity": 1},
+        ],
+    )
+
+    assert cart == {"the-gemma-classic": 2, "python-fries": 2}
+    assert left == {"the-gemma-classic": 1}
+
+
+def test_reduce_cart_removes_items_and_resets():
+    cart = reduce_cart({"python-fries": 2}, [{"id": "python-fries", "quantity": -2}])
+    assert cart == {}
+
+    cart = reduce_cart({"neural-shake": 1}, [{"command": "RESET"}])
+    assert cart == {}
+
+
+def test_cart_items_resolves_names_and_prices_from_menu():
+    items = cart_items({"the-gemma-classic": 2})
+
+    assert items == [
+        {
+            "id": "the-gemma-classic",
+            "name": "The Gemma Classic",
+            "price": 8.99,
+            "quantity": 2,
+        }
+    ]
+
+
+def test_resolve_item_id_tolerates_small_typos():
+    assert resolve_item_id("The Gemma Clasic") == "the-gemma-classic"
+    assert resolve_item_id("Pizza") is None
+
+
+@pytest.mark.parametrize(
+    "name, item_id",
+    [
+        ("fries", "python-fries"),
+        ("shakes", "neural-shake"),
+        ("Gemma Classic Burger", "the-gemma-classic"),
+        # 여러 메뉴에 해당하거나 메뉴에 없는 단어가 있으면 매칭하지 않음
+        ("burger", None),
+        ("Unicorn Burger", None),
+    ],
+)
+def test_resolve_item_id_matches_partial_names(name, item_id):
+    assert resolve_item_id(name) == item_id
+
+
+def test_reduce_cart_checks_ids_against_menu_and_logs_dropped_items(capsys):
+    cart = reduce_cart(
+        {},
+        [
+            {"id": "classic-burger", "name": "Gemma Classic Burger", "quantity": 1},
+            {"id": "unicorn-burger", "quantity": 1},
+        ],
+    )
+
+    assert cart == {"the-gemma-classic": 1}
+    assert "unicorn-burger" in capsys.readouterr().out
+
+
+def test_append_messages_returns_new_list_of_tuples():
+    left = [make_message(ROLE_USER, "Hi")]
+
+    messages = append_messages(left, [["assistant", "Hello!"]])
+
+    assert messages == [("user", "Hi"), ("assistant", "Hello!")]
+    assert len(left) == 1
+
+
+def test_load_menu_fails_when_menu_file_is_missing():
+    with pytest.raises(FileNotFoundError):
+        load_menu("missing_menu.json")
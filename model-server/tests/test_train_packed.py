@@ -0,0 +1,72 @@
+import mlx.core as mx
+import numpy as np
+
+from scripts.train_packed import (
+    MetricCallback,
+    SegmentMask,
+    iterate_packed_batches,
+    segment_attention_mask,
+    target_weights,
+)
+
+
+def test_segment_attention_mask_is_block_diagonal_and_causal():
+    mask = segment_attention_mask(mx.array([[1, 1, 2, 2, 2]]))
+
+    assert mask.shape == (1, 1, 5, 5)
+    assert mask[0, 0].tolist() == [
+        [True, False, False, False, False],
+        [True, True, False, False, False],
+        [False, False, True, False, False],
+        [False, False, True, True, False],
+        [False, False, True, True, True],
+    ]
+
+
+def test_segment_mask_applies_sliding_window():
+    cache = SegmentMask(mx.array([[1, 1, 1, 1]]))
+
+    mask = cache.make_mask(4, window_size=2)
+
+    assert mask[0, 0].tolist() == [
+        [True, False, False, False],
+        [True, True, False, False],
+        [False, True, True, False],
+        [False, False, True, True],
+    ]
+
+
+def test_target_weights_skip_segment_boundaries_and_padding():
+    segments = mx.array([[1, 1, 1, 2, 2, 0]])
+    loss_mask = mx.array([[0, 1, 1, 1, 1, 0]])
+
+    weights = target_weights(segments, loss_mask)
+
+    # 1->1, 1->1 학습 / 1->2 경계 제외 / 2->2 학습 / 2->패딩 제외
+    assert weights.tolist() == [[1, 1, 0, 1, 0]]
+
+
+def test_iterate_packed_batches_trims_trailing_padding():
+    dataset = [
+        (np.array([5, 6, 7, 0, 0, 0]), np.array([1, 1, 2, 0, 0, 0]), np.ones(6)),
+        (np.array([8, 9, 0, 0, 0, 0]), np.array([1, 1, 0, 0, 0, 0]), np.ones(6)),
+    ]
+
+    # 작은 데이터셋은 시퀀스가 batch_size보다 적으므로 있는 만큼 묶음
+    batches = list(iterate_packed_batches(dataset, batch_size=4, max_seq_length=6))
+
+    assert len(batches) == 1
+    tokens, segments, loss_mask = batches[0]
+    assert sorted(tokens.tolist()) == [[5, 6, 7], [8, 9, 0]]
+    assert segments.shape == (2, 3)
+    assert loss_mask.shape == (2, 3)
+
+
+def test_metric_callback_uses_stdout_iteration_numbers():
+    logged = []
+    callback = MetricCallback(lambda key, value, step: logged.append((key, step)))
+
+    callback.on_val_loss_report({"iteration": 0, "val_loss": 2.0})
+    callback.on_train_loss_report({"iteration": 10, "train_loss": 1.5})
+
+    assert logged == [("val_loss", 1), ("train_loss", 10)]
@@ -0,0 +1,30 @@
+from unittest.mock import MagicMock
+
+from mlflow.entities import Metric
+
+from scripts.train_with_mlflow import (
+    FLUSH_BATCH_SIZE,
+    replay_spool_file,
+    write_spool,
+)
+
+
+def make_metrics(count):
+    return [Metric("train_loss", float(i), 1000 + i, i) for i in range(count)]
+
+
+def test_replay_spool_file_keeps_only_unsent_metrics_after_partial_failure(tmp_path):
+    spool_path = str(tmp_path / "run-1.jsonl")
+    write_spool(spool_path, make_metrics(FLUSH_BATCH_SIZE + 5))
+    client = MagicMock()
+    client.log_batch.side_effect = [None, ConnectionError("server down")]
+
+    assert replay_spool_file(client, spool_path) is False
+
+    client.log_batch.side_effect = None
+    assert replay_spool_file(client, spool_path) is True
+    resent = client.log_batch.call_args.kwargs["metrics"]
+    assert [m.step for m in resent] == list(
+        range(FLUSH_BATCH_SIZE, FLUSH_BATCH_SIZE + 5)
+    )
+    assert not (tmp_path / "run-1.jsonl").exists()